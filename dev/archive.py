@@ -0,0 +1,60 @@
+import pandas as pd
+
+from schema import apply_schema, to_numeric
+
+# Архив погоды rp5 (как в model/train.ipynb): разделитель ';', новые записи сверху
+TIME_COLUMN = 'Местное время в Иркутске'
+TIME_FORMAT = '%d.%m.%Y %H:%M'
+SEP = ';'
+DROP_COLUMNS = ['P', 'Pa', 'ff10', 'ff3', 'Tn', 'Tx', 'VV', 'Td', 'E', 'Tg', "E'", 'sss', 'WW', 'W2', 'RRR', 'tR',
+                'DD', 'Cl', 'H', 'Cm', 'Ch']
+HOURLY_COLUMNS = ['T', 'Po', 'U', 'Ff', 'N', 'W1', 'Nh']
+COLUMNS = ['YEAR', 'MO', 'DY', 'HR'] + HOURLY_COLUMNS
+
+
+def read_archive(path, chunksize=None):
+    # chunksize - читать частями (итератор DataFrame), память не зависит от длины архива
+    return pd.read_csv(path, sep=SEP, encoding='utf-8', index_col=False, chunksize=chunksize)
+
+
+def normalize(df, normalizer):
+    # Текстовые описания облачности и явлений - в числа, теми же правилами, что у прогноза
+    df = df.drop(columns=DROP_COLUMNS, errors='ignore')
+    df['datetime'] = pd.to_datetime(df[TIME_COLUMN], format=TIME_FORMAT, errors='coerce').dt.floor('h')
+    df = df.drop(columns=[TIME_COLUMN]).dropna(subset=['datetime'])
+
+    normalizer.apply(df, ['N', 'W1', 'Nh'])
+    df['W1'] = df['W1'].fillna(0.0)
+    df['Nh'] = df['Nh'].fillna(0.0)
+
+    for column in HOURLY_COLUMNS:
+        df[column] = to_numeric(df[column])
+    return df
+
+
+def resample_hourly(df):
+    # Наблюдения раз в 3 часа -> почасовой ряд линейной интерполяцией
+    df = df.sort_values('datetime').drop_duplicates('datetime').set_index('datetime')
+
+    hourly_data = df[HOURLY_COLUMNS].resample('h').interpolate(method='linear')
+
+    hourly_data['YEAR'] = hourly_data.index.year
+    hourly_data['MO'] = hourly_data.index.month
+    hourly_data['DY'] = hourly_data.index.day
+    hourly_data['HR'] = hourly_data.index.hour
+    return hourly_data[COLUMNS]
+
+
+def prepare_archive(df, normalizer, boundary=None):
+    # boundary - соседняя запись из другой части архива: нужна, чтобы интерполировать
+    # часы между частями; сам час boundary остается за той частью, из которой она взята
+    df = normalize(df, normalizer)
+    if boundary is not None:
+        boundary = normalize(boundary, normalizer)
+        df = pd.concat([df, boundary], ignore_index=True)
+
+    hourly = resample_hourly(df)
+    if boundary is not None and len(boundary):
+        hourly = hourly[hourly.index != boundary['datetime'].iloc[0]]
+    # Интерполяция идет во float64, в схему (float32, малые целые) приводится результат
+    return apply_schema(hourly.reset_index(drop=True))
@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from archive import prepare_archive, read_archive
+from calc import calc_power
+from normalizer import get_normalizer
+from physics import FIXED, TRACKING_MODES
+from registry import get_model, set_defaults
+from sinks import make_sink
+
+# Строк архива в одной части (наблюдения раз в 3 часа: 20000 строк ~ 7 лет)
+CHUNK_ROWS = 20000
+# Каждый процесс держит свою копию данных частей, поэтому число процессов ограничено
+MAX_WORKERS = int(os.environ.get('SOLAR_BACKTEST_WORKERS', min(os.cpu_count() or 1, 4)))
+
+DAY_KEYS = ['YEAR', 'MO', 'DY']
+MONTH_KEYS = ['YEAR', 'MO']
+HOURLY_COLUMNS = ['YEAR', 'MO', 'DY', 'HR', 'ALLSKY_SFC_SW_DIFF', 'ALLSKY_SFC_SW_DWN', 'Wel']
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    # К каждой части прилагается последняя строка предыдущей: часы на стыке частей
+    # интерполируются так же, как при обработке архива целиком
+    boundary = None
+    for chunk in read_archive(path, chunksize=chunk_rows):
+        yield chunk, boundary
+        boundary = chunk.iloc[[-1]].copy()
+
+
+def backtest_chunk(chunk, boundary, panel, normalizer, hourly=False):
+    df = prepare_archive(chunk, normalizer, boundary)
+    if df.empty:
+        return pd.DataFrame(columns=DAY_KEYS + ['Wel', 'hours']), None
+
+    # Промежуточные величины физики не нужны: в часть попадает только Wel
+    power_df = calc_power(df, **panel, intermediates=False)
+    # Суммы энергии копятся во float64, даже если часы хранятся во float32
+    power_df['Wel'] = power_df['Wel'].astype(float)
+    daily = power_df.groupby(DAY_KEYS).agg(Wel=('Wel', 'sum'), hours=('Wel', 'size')).reset_index()
+    return daily, power_df[HOURLY_COLUMNS] if hourly else None
+
+
+def _init_worker():
+    # Воркеры читают плоскую модель через mmap из одного файла на диске:
+    # массивы деревьев не копируются в каждый процесс
+    set_defaults(backend='flat', mmap_mode='r')
+
+
+def _consume(result, daily_parts, sink):
+    daily, power_df = result
+    daily_parts.append(daily)
+    if sink is not None and power_df is not None:
+        sink.write(power_df)
+
+
+def run_backtest(path, panel, chunk_rows=CHUNK_ROWS, max_workers=MAX_WORKERS, hourly_sink=None, normalizer=None):
+    # panel - аргументы calc_power: KPD, LENGHT, WIDTH, optim, beta, y, tracking, stow_wind
+    normalizer = normalizer if normalizer is not None else get_normalizer()
+    hourly = hourly_sink is not None
+    daily_parts = []
+
+    if max_workers <= 1:
+        for chunk, boundary in iter_chunks(path, chunk_rows):
+            _consume(backtest_chunk(chunk, boundary, panel, normalizer, hourly), daily_parts, hourly_sink)
+    else:
+        # Плоский кэш модели строится один раз до запуска воркеров
+        get_model(backend='flat', mmap_mode='r')
+        # В работе не больше 2 * max_workers частей: память не растет с длиной архива
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+            pending = deque()
+            for chunk, boundary in iter_chunks(path, chunk_rows):
+                pending.append(pool.submit(backtest_chunk, chunk, boundary, panel, normalizer, hourly))
+                if len(pending) >= 2 * max_workers:
+                    _consume(pending.popleft().result(), daily_parts, hourly_sink)
+            while pending:
+                _consume(pending.popleft().result(), daily_parts, hourly_sink)
+
+    return aggregate(daily_parts)
+
+
+def aggregate(daily_parts):
+    # День может попасть в две части архива: частичные суммы складываются
+    daily = pd.concat(daily_parts, ignore_index=True)
+    daily = daily.groupby(DAY_KEYS, as_index=False)[['Wel', 'hours']].sum()
+    daily['hours'] = daily['hours'].astype(int)
+
+    monthly = daily.groupby(MONTH_KEYS).agg(Wel=('Wel', 'sum'), hours=('hours', 'sum'), days=('DY', 'size'))
+    return daily, monthly.reset_index()
+
+
+def _save(df, path):
+    sink = make_sink(path, encoding='utf-8-sig')
+    try:
+        sink.write(df)
+    finally:
+        sink.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Расчет выработки по архиву погоды rp5 (бэктест)")
+    parser.add_argument('archive', help="архив rp5 (.csv, разделитель ';')")
+    parser.add_argument('--efficiency', type=float, required=True, help="КПД, %%")
+    parser.add_argument('--length', type=float, required=True, help="длина, м")
+    parser.add_argument('--width', type=float, required=True, help="ширина, м")
+    parser.add_argument('--tilt', type=float, help="наклон, °; без наклона и азимута - оптимальное положение")
+    parser.add_argument('--azimuth', type=float, help="азимут, °")
+    parser.add_argument('--tracking', choices=TRACKING_MODES, default=FIXED,
+                        help="следящая система: fixed - нет, single - одноосная, dual - двухосная")
+    parser.add_argument('--stow-wind', type=float, help="скорость ветра, м/с, выше которой панель уходит в горизонт")
+    parser.add_argument('--daily', default='backtest_daily.csv', help="суммы по дням")
+    parser.add_argument('--monthly', default='backtest_monthly.csv', help="суммы по месяцам")
+    parser.add_argument('--hourly', help="почасовой результат (.csv/.parquet/.arrow)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    args = parser.parse_args(argv)
+    if (args.tilt is None) != (args.azimuth is None):
+        parser.error("--tilt и --azimuth задаются вместе; без обоих - оптимальное положение")
+
+    optim = args.tilt is None
+    panel = {
+        'KPD': args.efficiency / 100,
+        'LENGHT': args.length,
+        'WIDTH': args.width,
+        'optim': optim,
+        'beta': None if optim else args.tilt,
+        'y': None if optim else args.azimuth,
+        'tracking': args.tracking,
+        'stow_wind': args.stow_wind,
+    }
+
+    hourly_sink = make_sink(args.hourly, columns=HOURLY_COLUMNS) if args.hourly else None
+    try:
+        daily, monthly = run_backtest(args.archive, panel, args.chunk_rows, args.workers, hourly_sink)
+    finally:
+        if hourly_sink is not None:
+            hourly_sink.close()
+
+    _save(daily, args.daily)
+    _save(monthly, args.monthly)
+    print(f"Дней: {len(daily)}, месяцев: {len(monthly)}, выработка: {daily['Wel'].sum():.1f} кВт*ч")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from calc import build_features, calc_power, calc_power_quantiles, prepare_forecast
+from fake_rp5 import make_snapshot
+from parser import parse_weather
+from registry import MODEL_PATH, file_hash, get_model
+from schema import COMPACT, apply_schema, frame_mb, peak_rss_mb
+from tables import load_tables
+
+# Размеры входа в строках: неделя прогноза rp5 (шаг 3 ч), неделя, год и 15 лет почасовых данных
+SIZES = {'week_3h': 56, 'week': 168, 'year': 8760, '15_years': 15 * 8760}
+QUICK_SIZES = ('week_3h', 'week', 'year')
+# Замер памяти - на 10 годах почасовых данных
+MEMORY_ROWS = 10 * 8760
+
+# Допустимый рост медианы относительно базового замера: 0.2 - на 20%
+THRESHOLD = 0.2
+
+# Общий бюджет времени на один замер: мелкие входы повторяются чаще
+TIME_BUDGET = 2.0
+MIN_REPEAT = 3
+MAX_REPEAT = 50
+
+START = pd.Timestamp('2024-01-01')
+
+
+def synthetic_forecast(n_rows, step=1, start=START, seed=0):
+    # Таблица в формате parse_weather: строки rp5 приводятся к схеме schema.py
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=n_rows, freq=f'{step}h')
+    return apply_schema(pd.DataFrame({
+        'YEAR': times.year.to_numpy(),
+        'MO': times.month.to_numpy(),
+        'DY': times.day.to_numpy(),
+        'HR': times.hour.astype(str).to_numpy(dtype=object),
+        'N': rng.choice([0.0, 0.1, 0.5, 0.7, 1.0], n_rows),
+        'Nh': rng.choice([0.0, 0.1, 0.5, 0.7, 1.0], n_rows).astype(str).astype(object),
+        'W1': rng.choice([0.0, 1.0, 2.0], n_rows),
+        'T': rng.integers(-30, 31, n_rows).astype(str).astype(object),
+        'Po': rng.integers(700, 771, n_rows).astype(str).astype(object),
+        'Ff': rng.integers(0, 16, n_rows).astype(str).astype(object),
+        'U': rng.integers(20, 101, n_rows).astype(str).astype(object),
+    }))
+
+
+def measure(fn, budget=TIME_BUDGET):
+    # Первый вызов - прогрев, его время задает число повторов
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    repeat = int(min(MAX_REPEAT, max(MIN_REPEAT, budget // max(first, 1e-9))))
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'max_s': max(times),
+    }
+
+
+def bench_calc_power(sizes):
+    results = {}
+    for name in sizes:
+        df = synthetic_forecast(SIZES[name], step=3 if name == 'week_3h' else 1)
+        results[f'calc_power/optim/{name}'] = measure(lambda: calc_power(df, 0.2, 1.6, 1.0, True))
+        results[f'calc_power/fixed/{name}'] = measure(lambda: calc_power(df, 0.2, 1.6, 1.0, False, 45, 0))
+        results[f'calc_power/quantiles/{name}'] = measure(lambda: calc_power_quantiles(df, 0.2, 1.6, 1.0, True))
+        results[f'calc_power/single/{name}'] = measure(
+            lambda: calc_power(df, 0.2, 1.6, 1.0, False, 0, 0, tracking='single'))
+        results[f'calc_power/dual_stow/{name}'] = measure(
+            lambda: calc_power(df, 0.2, 1.6, 1.0, False, 0, 0, tracking='dual', stow_wind=10))
+        for key in ('optim', 'fixed', 'quantiles', 'single', 'dual_stow'):
+            results[f'calc_power/{key}/{name}']['rows'] = len(df)
+    return results
+
+
+def bench_predict(sizes):
+    model = get_model()
+    results = {}
+    for name in sizes:
+        X = build_features(prepare_forecast(synthetic_forecast(SIZES[name], step=3 if name == 'week_3h' else 1)))
+        results[f'predict/{name}'] = measure(lambda: model.predict(X))
+        results[f'predict/{name}']['rows'] = len(X)
+    return results
+
+
+def bench_parse(pages):
+    # pages - сохраненные страницы rp5 (parser.save_snapshot); без них - синтетические make_snapshot
+    if pages:
+        fixtures = {}
+        for path in pages:
+            with open(path, encoding='utf-8') as f:
+                fixtures[os.path.basename(path)] = f.read()
+    else:
+        start = START.to_pydatetime()
+        fixtures = {
+            'snapshot_week_3h': make_snapshot(days=7, step=3, start=start),
+            'snapshot_week': make_snapshot(days=7, step=1, start=start),
+            'snapshot_month': make_snapshot(days=30, step=1, start=start),
+        }
+
+    results = {}
+    for name, html in fixtures.items():
+        results[f'parse/{name}'] = measure(lambda: parse_weather(html=html))
+        results[f'parse/{name}']['bytes'] = len(html.encode('utf-8'))
+    return results
+
+
+def bench_memory(rows=MEMORY_ROWS):
+    # Пик памяти за расчет (tracemalloc) вместе с входной таблицей прогноза;
+    # сравнение раскладок - запуском с SOLAR_COMPACT=0
+    df = synthetic_forecast(rows)
+    results = {}
+    for name, intermediates in (('all', True), ('wel', False)):
+        tracemalloc.start()
+        power_df = calc_power(df, 0.2, 1.6, 1.0, False, 45, 0, intermediates=intermediates)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        results[f'memory/{name}/10_years'] = {
+            'rows': rows,
+            'peak_mb': frame_mb(df) + peak,
+            'forecast_mb': frame_mb(df),
+            'result_mb': frame_mb(power_df),
+        }
+        del power_df
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'model_hash': file_hash(MODEL_PATH),
+        'compact': COMPACT,
+        'peak_rss_mb': peak_rss_mb(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    # Сравниваются медианы времени и пики памяти; замеры, которых нет в базовом файле, пропускаются
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        metric = 'median_s' if 'median_s' in current else 'peak_mb'
+        if metric not in base:
+            continue
+        ratio = current[metric] / base[metric]
+        if ratio > 1 + threshold:
+            regressions.append((name, metric, base[metric], current[metric], ratio))
+    return regressions
+
+
+def format_result(result):
+    if 'median_s' in result:
+        return f"{result['median_s'] * 1000:10.2f} мс  (x{result['repeat']})"
+    return f"{result['peak_mb']:10.2f} МБ  (прогноз {result['forecast_mb']:.2f} МБ, результат {result['result_mb']:.2f} МБ)"
+
+
+def run(sizes=tuple(SIZES), pages=None, groups=('calc_power', 'parse', 'predict', 'memory')):
+    load_tables()
+    get_model()
+
+    results = {}
+    if 'calc_power' in groups:
+        results.update(bench_calc_power(sizes))
+    if 'parse' in groups:
+        results.update(bench_parse(pages))
+    if 'predict' in groups:
+        results.update(bench_predict(sizes))
+    if 'memory' in groups:
+        results.update(bench_memory())
+    return {'environment': environment(), 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры calc_power, parse_weather, predict и памяти")
+    parser.add_argument('--output', help="JSON с результатами")
+    parser.add_argument('--baseline', help="JSON предыдущего запуска для сравнения")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="допустимый рост медианы или пика памяти, доля (0.2 = 20%%)")
+    parser.add_argument('--quick', action='store_true', help="без 15 лет почасовых данных")
+    parser.add_argument('--pages', nargs='*', default=[], help="сохраненные страницы rp5 (glob)")
+    parser.add_argument('--only', nargs='*', choices=['calc_power', 'parse', 'predict', 'memory'],
+                        default=['calc_power', 'parse', 'predict', 'memory'])
+    args = parser.parse_args(argv)
+
+    pages = sorted(path for pattern in args.pages for path in glob.glob(pattern))
+    report = run(QUICK_SIZES if args.quick else tuple(SIZES), pages, args.only)
+
+    for name, result in report['results'].items():
+        print(f"{name:40s} {format_result(result)}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('environment', {}).get('model_hash') != report['environment']['model_hash']:
+            print("Внимание: базовый замер сделан с другой моделью", file=sys.stderr)
+        regressions = compare(report['results'], baseline, args.threshold)
+        for name, metric, base, current, ratio in regressions:
+            if metric == 'median_s':
+                change = f"{base * 1000:.2f} -> {current * 1000:.2f} мс"
+            else:
+                change = f"{base:.2f} -> {current:.2f} МБ"
+            print(f"Регрессия {name}: {change} (x{ratio:.2f})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
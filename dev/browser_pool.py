@@ -0,0 +1,265 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from instrument import stage
+from retry import on_abandon
+
+POOL_SIZE = int(os.environ.get('SOLAR_BROWSER_POOL_SIZE', 1))
+# Chrome со временем растет в памяти: после стольких загрузок или при превышении лимита сессия пересоздается
+MAX_USES = int(os.environ.get('SOLAR_BROWSER_MAX_USES', 50))
+MEMORY_LIMIT_MB = float(os.environ.get('SOLAR_BROWSER_MEMORY_MB', 1024))
+PAGE_TIMEOUT = 15
+
+# Путь к chromedriver можно задать явно, иначе он один раз за процесс берется у webdriver_manager
+CHROMEDRIVER = os.environ.get('SOLAR_CHROMEDRIVER')
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def driver_path():
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            if CHROMEDRIVER:
+                _driver_path = CHROMEDRIVER
+            else:
+                from webdriver_manager.chrome import ChromeDriverManager
+                _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def create_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--no-sandbox")
+    return webdriver.Chrome(service=Service(driver_path()), options=chrome_options)
+
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created = time.time()
+        # Место сессии в пуле уже освобождено (release или брошенная попытка)
+        self.retired = False
+
+    def is_healthy(self):
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _process(self):
+        service = getattr(self.driver, 'service', None)
+        process = getattr(service, 'process', None)
+        return getattr(process, 'pid', None)
+
+    def memory_mb(self):
+        # chromedriver и все дочерние процессы Chrome; без psutil - None (проверка отключена)
+        pid = self._process()
+        if psutil is None or pid is None:
+            return None
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 2 ** 20
+
+    def load_forecast(self, url, table_id, timeout=PAGE_TIMEOUT):
+        # Таблица прогноза забирается одним вызовом скрипта вместо запроса к каждой ячейке
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.driver.get(url)
+        wait = WebDriverWait(self.driver, timeout)
+        wait.until(EC.element_to_be_clickable((By.ID, "ftab-0"))).click()
+        wait.until(EC.presence_of_element_located((By.ID, table_id)))
+        return self.driver.execute_script(
+            "return document.getElementById(arguments[0]).outerHTML;", table_id
+        )
+
+    def quit(self):
+        pid = self._process()
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+        # Если chromedriver не завершился сам, добиваем его вместе с Chrome, чтобы не оставлять зомби
+        if psutil is not None and pid is not None:
+            try:
+                root = psutil.Process(pid)
+                processes = root.children(recursive=True) + [root]
+            except psutil.Error:
+                return
+            for process in processes:
+                try:
+                    process.kill()
+                except psutil.Error:
+                    pass
+            psutil.wait_procs(processes, timeout=5)
+
+
+class BrowserPool:
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, memory_limit_mb=MEMORY_LIMIT_MB, factory=create_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.memory_limit_mb = memory_limit_mb
+        self.factory = factory
+        self.created = 0
+        self.recycled = 0
+        self._idle = []
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def ensure_size(self, size):
+        # Вызывающий код загружает size страниц параллельно: пул растет до этого размера,
+        # иначе загрузки выстраиваются в очередь к одному браузеру
+        with self._cond:
+            if size > self.size:
+                self.size = size
+                self._cond.notify_all()
+
+    def _create(self):
+        with stage('browser'):
+            session = BrowserSession(self.factory())
+        with self._cond:
+            self.created += 1
+        return session
+
+    def _retire(self, session):
+        # Освобождает место сессии ровно один раз, кто бы ни пришел первым
+        with self._cond:
+            if session.retired:
+                return False
+            session.retired = True
+            self._count -= 1
+            self.recycled += 1
+            self._cond.notify()
+        return True
+
+    def _dispose(self, session):
+        if self._retire(session):
+            session.quit()
+
+    def abandon(self, session):
+        # Попытку бросили по таймауту или отмене, а ее поток еще держит сессию: место отдается
+        # следующей попытке сразу, Chrome закрывается в фоне, и зависший вызов в потоке падает
+        if self._retire(session):
+            threading.Thread(target=session.quit, name='browser-quit', daemon=True).start()
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Пул браузеров закрыт")
+                if self._idle:
+                    session = self._idle.pop()
+                    break
+                if self._count < self.size:
+                    self._count += 1
+                    session = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Нет свободного браузера")
+                self._cond.wait(remaining)
+
+        if session is not None:
+            if session.is_healthy():
+                return session
+            # Сессия умерла, пока простаивала: место в пуле переходит новой
+            session.quit()
+            with self._cond:
+                self.recycled += 1
+
+        try:
+            return self._create()
+        except BaseException:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, session, broken=False):
+        session.uses += 1
+        memory = session.memory_mb() if self.memory_limit_mb and not session.retired else None
+        worn_out = session.uses >= self.max_uses or (memory is not None and memory > self.memory_limit_mb)
+
+        with self._cond:
+            if session.retired:
+                # Попытку бросили: место уже отдано, Chrome закрывает abandon
+                return
+            keep = not (broken or worn_out or self._closed)
+            if keep:
+                self._idle.append(session)
+                self._cond.notify()
+        if not keep:
+            self._dispose(session)
+
+    @contextmanager
+    def session(self, timeout=None):
+        session = self.acquire(timeout)
+        on_abandon(lambda: self.abandon(session))
+        try:
+            yield session
+        except BaseException:
+            # После ошибки состояние браузера неизвестно: сессия не возвращается в пул
+            self.release(session, broken=True)
+            raise
+        self.release(session)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for session in idle:
+            self._dispose(session)
+
+    def stats(self):
+        with self._cond:
+            return {'size': self.size, 'open': self._count, 'idle': len(self._idle),
+                    'created': self.created, 'recycled': self.recycled}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = BrowserPool()
+        return _pool
+
+
+@atexit.register
+def close_pool():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
@@ -1,100 +1,246 @@
-import joblib
+import os
 import numpy as np
 import pandas as pd
-import os
-from sklearn.ensemble import RandomForestRegressor
-
-def calc_power(df, KPD, LENGHT, WIDTH, optim, beta = None, y = None):
-    
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    rad = os.path.join(script_dir, 'data/params.csv')
-    df2 = pd.read_csv(rad, delimiter=',', encoding='utf-8', index_col=False)
+from physics import FIXED, LANTITUDE, calc_physics, panel_position, tracking_angles
+from registry import get_model
+from tables import lookup_geometry
+from solar import site_geometry
+from instrument import stage
+from features import build_features as feature_matrix
+from schema import FLOAT, apply_schema
+
+# Перцентили выработки для режима с неопределенностью
+QUANTILES = (10, 50, 90)
+# Ячеек (часы x панели) в одном блоке расчета флота: 2**19 ячеек float32 - 2 МБ на массив
+FLEET_BLOCK_CELLS = int(os.environ.get('SOLAR_FLEET_BLOCK_CELLS', 2 ** 19))
+# Строк в одном блоке признаков и предсказания: неделя прогноза - один блок
+PREDICT_BLOCK = int(os.environ.get('SOLAR_PREDICT_BLOCK', 2 ** 14))
+
+def prepare_forecast(df, site=None):
+    # site - параметры solar_geometry (lantitude, longitude, tz); None - таблицы Иркутска
+    with stage('geometry'):
+        df = df.reset_index(drop=True)
+        if site is None:
+            geometry = lookup_geometry(df['MO'], df['DY'], df['HR'], df.get('YEAR'))
+        else:
+            geometry = site_geometry(df['MO'], df['DY'], df['HR'], site)
+        for column, values in geometry.items():
+            df[column] = values
+
+        # Строки прогноза и геометрия таблиц - в типы схемы (float32, малые целые)
+        return apply_schema(df)
+
+
+def build_features(df):
+    with stage('features'):
+        return feature_matrix(df)
+
+
+def feature_blocks(df, block=PREDICT_BLOCK):
+    # Признаки строятся блоками строк: матрица признаков и предсказания деревьев не растут
+    # с длиной расчета; строки независимы, поэтому результат тот же, что одним блоком
+    for start in range(0, max(len(df), 1), block):
+        yield build_features(df.iloc[start:start + block])
+
+
+def add_radiation(df, rf_pred):
+    # Колонки добавляются к неглубокой копии без копирования данных;
+    # переданная таблица (кэш геометрии в pipeline) не меняется
+    df = df.copy(deep=False)
+    rf_pred = np.asarray(rf_pred)
+    df['ALLSKY_SFC_SW_DIFF'] = rf_pred[:, 0].astype(FLOAT)
+    df['ALLSKY_SFC_SW_DWN'] = rf_pred[:, 1].astype(FLOAT)
+    return df
+
+
+def predict_radiation(df, site=None):
+    df = prepare_forecast(df, site)
+    model = get_model()
+    rf_pred = []
+    for X in feature_blocks(df):
+        with stage('predict'):
+            rf_pred.append(model.predict(X))
+    return add_radiation(df, np.concatenate(rf_pred))
+
+
+def predict_radiation_quantiles(df, site=None, quantiles=QUANTILES):
+    # Все деревья леса за один проход FlatForest.predict_trees: среднее (как predict) и перцентили
+    df = prepare_forecast(df, site)
+    model = get_model(backend='flat')
+    means, bands = [], []
+    for X in feature_blocks(df):
+        with stage('predict_trees'):
+            trees = model.predict_trees(X)
+        means.append(trees.mean(axis=1).T)
+        bands.append(np.percentile(trees, quantiles, axis=1))
+    df = add_radiation(df, np.concatenate(means))
+
+    bands = np.concatenate(bands, axis=2)
+    for q, band in zip(quantiles, bands):
+        df[f'ALLSKY_SFC_SW_DIFF_p{q}'] = band[0].astype(FLOAT)
+        df[f'ALLSKY_SFC_SW_DWN_p{q}'] = band[1].astype(FLOAT)
+    return df
+
+
+def site_lantitude(site):
+    if site is None:
+        return LANTITUDE
+    return site.get('lantitude', LANTITUDE)
+
+
+def position_panel(df, optim, beta, y, tracking, stow_wind, site):
+    # Колонки beta/y - фактическое положение панели по часам: заданное, оптимальное из params.csv
+    # или следящей системы, с горизонтом при ветре сильнее stow_wind
     if not(optim):
-        df = pd.merge(df, df2[['MO', 'DY', 'HR', 'SZA','ALB','NDAY','delta','sina']], on=['MO', 'DY', 'HR'], how='left')
-        df['beta'] = df.apply(lambda row: beta, axis=1)
-        df['y'] = df.apply(lambda row: y, axis=1)
-    else:
-        df = pd.merge(df, df2[['MO', 'DY', 'HR', 'SZA','ALB','NDAY','delta','sina','beta','y']], on=['MO', 'DY', 'HR'], how='left')
-
-    w = os.path.join(script_dir, 'data/w.csv')
-    df2 = pd.read_csv(w, delimiter=',', encoding='utf-8', index_col=False)
-    df = pd.merge(df, df2[['HR', 'w']], on=['HR'], how='left')
-
-    df['T'] = pd.to_numeric(df['T'], errors='coerce')
-    df['Ff'] = pd.to_numeric(df['Ff'], errors='coerce')
-
-    rf_model = os.path.join(script_dir, 'model.pkl')
-    rf_model = joblib.load(rf_model)
-
-    data_test = df.copy()
+        df['beta'] = np.full(len(df), beta, dtype=FLOAT)
+        df['y'] = np.full(len(df), y, dtype=FLOAT)
+    if tracking != FIXED or stow_wind is not None:
+        df['beta'], df['y'] = panel_position(
+            df['beta'].to_numpy(dtype=FLOAT), df['y'].to_numpy(dtype=FLOAT),
+            df['delta'].to_numpy(dtype=FLOAT), df['w'].to_numpy(dtype=FLOAT), df['Ff'].to_numpy(dtype=FLOAT),
+            tracking, stow_wind, site_lantitude(site)
+        )
+
+
+def apply_physics(df, KPD, LENGHT, WIDTH, optim, beta = None, y = None, sink = None, site = None,
+                  intermediates = True, tracking = FIXED, stow_wind = None):
+    # intermediates=False - в таблицу попадает только Wel, без Hgt, Tmod и других промежуточных величин
+    # tracking - режим из physics.TRACKING_MODES, stow_wind - скорость ветра (м/с), выше которой
+    # панель уходит в горизонт; None - без защиты
+
+    position_panel(df, optim, beta, y, tracking, stow_wind, site)
+
+    with stage('physics'):
+        physics = calc_physics(
+            diff=df['ALLSKY_SFC_SW_DIFF'].to_numpy(dtype=FLOAT),
+            dwn=df['ALLSKY_SFC_SW_DWN'].to_numpy(dtype=FLOAT),
+            alb=df['ALB'].to_numpy(dtype=FLOAT),
+            sina=df['sina'].to_numpy(dtype=FLOAT),
+            delta=df['delta'].to_numpy(dtype=FLOAT),
+            w=df['w'].to_numpy(dtype=FLOAT),
+            beta=df['beta'].to_numpy(dtype=FLOAT),
+            y=df['y'].to_numpy(dtype=FLOAT),
+            T=df['T'].to_numpy(dtype=FLOAT),
+            Ff=df['Ff'].to_numpy(dtype=FLOAT),
+            KPD=KPD, LENGHT=LENGHT, WIDTH=WIDTH,
+            lantitude=site_lantitude(site),
+            intermediates=intermediates
+        )
+        for column, values in physics.items():
+            df[column] = values
+
+    if sink is not None:
+        with stage('write'):
+            sink.write(df)
+
+    return df
+
+
+def calc_power(df, KPD, LENGHT, WIDTH, optim, beta = None, y = None, sink = None, site = None,
+               intermediates = True, tracking = FIXED, stow_wind = None):
+
+    with stage('calc_power'):
+        df = predict_radiation(df, site)
+        return apply_physics(df, KPD, LENGHT, WIDTH, optim, beta, y, sink, site, intermediates,
+                             tracking, stow_wind)
+
+
+def calc_power_quantiles(df, KPD, LENGHT, WIDTH, optim, beta = None, y = None, sink = None, site = None,
+                         quantiles = QUANTILES, tracking = FIXED, stow_wind = None):
+    # Wel по среднему предсказанию и Wel_p10/p50/p90: перцентили радиации по деревьям леса
+    # (отдельно для рассеянной и суммарной) пропускаются через ту же физику
+    quantiles = sorted(quantiles)
+    with stage('calc_power'):
+        df = predict_radiation_quantiles(df, site, quantiles)
+        df = apply_physics(df, KPD, LENGHT, WIDTH, optim, beta, y, site=site,
+                           tracking=tracking, stow_wind=stow_wind)
+
+        with stage('quantiles'):
+            bands = []
+            for q in quantiles:
+                bands.append(calc_physics(
+                    diff=df[f'ALLSKY_SFC_SW_DIFF_p{q}'].to_numpy(dtype=FLOAT),
+                    dwn=df[f'ALLSKY_SFC_SW_DWN_p{q}'].to_numpy(dtype=FLOAT),
+                    alb=df['ALB'].to_numpy(dtype=FLOAT),
+                    sina=df['sina'].to_numpy(dtype=FLOAT),
+                    delta=df['delta'].to_numpy(dtype=FLOAT),
+                    w=df['w'].to_numpy(dtype=FLOAT),
+                    beta=df['beta'].to_numpy(dtype=FLOAT),
+                    y=df['y'].to_numpy(dtype=FLOAT),
+                    T=df['T'].to_numpy(dtype=FLOAT),
+                    Ff=df['Ff'].to_numpy(dtype=FLOAT),
+                    KPD=KPD, LENGHT=LENGHT, WIDTH=WIDTH,
+                    lantitude=site_lantitude(site),
+                    intermediates=False
+                )['Wel'])
+            # Перцентили двух целевых переменных берутся независимо, поэтому полосы Wel могут
+            # пересекаться; сортировка по строке восстанавливает порядок p10 <= p50 <= p90
+            bands = np.sort(np.array(bands), axis=0)
+            for q, band in zip(quantiles, bands):
+                df[f'Wel_p{q}'] = band
+
+        if sink is not None:
+            with stage('write'):
+                sink.write(df)
+
+        return df
+
+
+def calc_power_fleet(df, panels, site=None, block_cells=FLEET_BLOCK_CELLS):
+    # panels - таблица с колонками KPD, LENGHT, WIDTH, beta, y; пустые beta/y - оптимальное положение.
+    # Необязательные колонки: tracking (режим из physics.TRACKING_MODES) и stow_wind (пусто - без защиты)
+    df = predict_radiation(df, site)
+
+    def column(name, rows):
+        return df[name].to_numpy(dtype=FLOAT)[rows, None]
+
+    def panel(name):
+        return panels[name].to_numpy(dtype=FLOAT)[None, :]
+
+    lantitude = site_lantitude(site)
+    tracking = panels['tracking'].fillna(FIXED).to_numpy() if 'tracking' in panels else np.full(len(panels), FIXED)
+    modes = [mode for mode in dict.fromkeys(tracking) if mode != FIXED]
+    stow_wind = panel('stow_wind') if 'stow_wind' in panels else None
+
+    # Матрица часы x панели считается блоками строк прямо в итоговый массив:
+    # промежуточные массивы физики ограничены размером блока, а не длиной расчета
+    Wel = np.empty((len(df), len(panels)), dtype=FLOAT)
+    block = max(1, block_cells // max(1, len(panels)))
+    for start in range(0, len(df), block):
+        rows = slice(start, start + block)
+        beta = panel('beta')
+        y = panel('y')
+        beta = np.where(np.isnan(beta), column('beta', rows), beta)
+        y = np.where(np.isnan(y), column('y', rows), y)
+        # Углы слежения считаются один раз на блок для каждого режима и раздаются его панелям
+        for mode in modes:
+            mode_beta, mode_y = tracking_angles(mode, column('delta', rows), column('w', rows), lantitude)
+            selected = (tracking == mode)[None, :]
+            beta = np.where(selected, mode_beta, beta)
+            y = np.where(selected, mode_y, y)
+        if stow_wind is not None:
+            # Пустой порог: сравнение с NaN ложно, панель не убирается
+            beta = np.where(column('Ff', rows) > stow_wind, FLOAT(0), beta)
+
+        Wel[rows] = calc_physics(
+            diff=column('ALLSKY_SFC_SW_DIFF', rows),
+            dwn=column('ALLSKY_SFC_SW_DWN', rows),
+            alb=column('ALB', rows),
+            sina=column('sina', rows),
+            delta=column('delta', rows),
+            w=column('w', rows),
+            beta=beta,
+            y=y,
+            T=column('T', rows),
+            Ff=column('Ff', rows),
+            KPD=panel('KPD'), LENGHT=panel('LENGHT'), WIDTH=panel('WIDTH'),
+            lantitude=lantitude,
+            intermediates=False
+        )['Wel']
 
-    data_test['MO'] = data_test['MO'].astype(int)
-    data_test['DY'] = data_test['DY'].astype(int)
-
-    data_test['DayOfYear'] = pd.to_datetime(
-        data_test[['YEAR', 'MO', 'DY']].astype(str).agg('-'.join, axis=1), errors='coerce'
-    ).dt.dayofyear.fillna(0).astype(int)
-
-    data_test['sin_month'] = np.sin(2 * np.pi * data_test['MO'] / 12)
-    data_test['cos_month'] = np.cos(2 * np.pi * data_test['MO'] / 12)
-
-    data_test['sin_hour'] = np.sin(2 * np.pi * data_test['HR'].astype(int) / 24)
-    data_test['cos_hour'] = np.cos(2 * np.pi * data_test['HR'].astype(int) / 24)
-    data_test['sin_day_year'] = np.sin(2 * np.pi * data_test['DayOfYear'] / 365)
-    data_test['cos_day_year'] = np.cos(2 * np.pi * data_test['DayOfYear'] / 365)
-
-    features = ['sin_month', 'cos_month', 'sin_hour', 'cos_hour', 'sin_day_year', 'cos_day_year',
-                'T', 'Po', 'U', 'Ff', 'SZA', 'N', 'W1', 'Nh']
-
-    X_test = data_test[features]
-    X_test.to_csv('test_data.csv', index=False, encoding="utf-8")
-
-    rf_pred = rf_model.predict(X_test)
-    rad_pred = pd.DataFrame(rf_pred, columns=['ALLSKY_SFC_SW_DIFF', 'ALLSKY_SFC_SW_DWN'])
     times = ['YEAR', 'MO', 'DY', 'HR']
-    df_time = data_test[times]
-    df = pd.concat([df, rad_pred], axis=1)
-
-    LANTITUDE = 52.3
-
-    df['rad_pram'] = df.apply(lambda row: row['ALLSKY_SFC_SW_DWN']-row['ALLSKY_SFC_SW_DIFF'], axis=1)
-
-    df['cos'] = df.apply(lambda row: 
-        np.sin(row['beta'] * np.pi/180) * (
-            np.cos(row['delta'] * np.pi/180) * (
-                np.sin(LANTITUDE * np.pi/180) * np.cos(row['y'] * np.pi/180) * np.cos(row['w'] * np.pi/180) + 
-                np.sin(row['y'] * np.pi/180) * np.sin(row['w'] * np.pi/180)
-            ) - 
-            np.sin(row['delta'] * np.pi/180) * np.cos(LANTITUDE * np.pi/180) * np.cos(row['y'] * np.pi/180)
-        ) + 
-        np.cos(row['beta'] * np.pi/180) * (
-            np.cos(row['delta'] * np.pi/180) * np.cos(LANTITUDE * np.pi/180) * np.cos(row['w'] * np.pi/180) + 
-            np.sin(row['delta'] * np.pi/180) * np.sin(LANTITUDE * np.pi/180)
-        ), axis=1)
-
-    df['Hnorm'] = df.apply(lambda row: row['rad_pram']/row['sina'], axis=1)
-
-    df['Hbt'] = df.apply(lambda row: row['Hnorm']*row['cos'], axis=1)
-
-    df['Hdt'] = df.apply(lambda row: row['ALLSKY_SFC_SW_DIFF']*(1+np.cos(row['beta']*np.pi/180))/2, axis=1)
-
-    df['Hrt'] = df.apply(lambda row: row['ALB']*row['ALLSKY_SFC_SW_DWN']*(1-np.cos(row['beta']*np.pi/180))/2, axis=1)
-
-    df['Hgt'] = df.apply(lambda row: row['Hbt']+row['Hdt']+row['Hrt'], axis=1)
-
-    df['Tmod'] = df.apply(lambda row: row['Hgt']*np.exp(-3.47-0.075*row['Ff'])+row['T'], axis=1)
-
-    df['Tyach'] = df.apply(lambda row: row['Tmod']+(row['Hgt']/1000)*2.5, axis=1)
-
-    df['W'] = df.apply(lambda row: row['Hgt']*(1-0.47*(row['Tyach']-25)/100), axis=1)
-
-    df['Wel'] = df.apply(lambda row: row['W']*KPD*LENGHT*WIDTH, axis=1)
-
-    df.loc[df['Wel'] < 0, 'Wel'] = 0
-    df.loc[df['sina'] < 0, 'Wel'] = 0
-
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    file = os.path.join(script_dir, "test_data.csv")
-    df.to_csv(file, index=False, encoding="utf-8")
-
-    return df
\ No newline at end of file
+    return pd.DataFrame(
+        Wel,
+        index=pd.MultiIndex.from_frame(df[times]),
+        columns=panels.index
+    )
@@ -0,0 +1,114 @@
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MONTHS = ["января", "февраля", "марта", "апреля", "мая", "июня",
+          "июля", "августа", "сентября", "октября", "ноября", "декабря"]
+CLOUDS = [("Ясно", 0), ("Малооблачно", 10), ("Переменная облачность", 40),
+          ("Облачно с прояснениями", 50), ("Облачно", 70), ("Пасмурная погода", 100)]
+PRECIPITATION = ["Без осадков", "Слабый дождь", "Слабый снег"]
+
+
+def _row(label, cells):
+    # Первая и последняя ячейки строки - подписи, парсер их отбрасывает
+    return f"<tr><td>{label}</td>{''.join(f'<td>{c}</td>' for c in cells)}<td>{label}</td></tr>"
+
+
+def make_snapshot(days=7, step=3, start=None, seed=0):
+    # Синтетическая страница со структурой таблицы forecastTable_1_3 для тестов и бенчмарков без сети
+    rng = random.Random(seed)
+    start = start or datetime.today().replace(minute=0, second=0, microsecond=0)
+    start = start.replace(hour=start.hour - start.hour % step)
+    times = [start + timedelta(hours=step * i) for i in range(days * 24 // step)]
+
+    dates = sorted({t.date() for t in times})
+    clouds = [rng.choice(CLOUDS) for _ in times]
+
+    rows = [
+        _row("Дата", [f"{d.day} {MONTHS[d.month - 1]}" for d in dates]),
+        _row("Местное время", [str(t.hour) for t in times]),
+        _row("<div class=\"cc_0\"></div>", [
+            f"<div class=\"cc_0\"><div onmouseover=\"tooltip(this, '<b>{name}</b><br/>(облака нижнего яруса {percent}%)', '')\"></div></div>"
+            for name, percent in clouds
+        ]),
+        _row("<div class=\"pr_0\"></div>", [
+            f"<div class=\"pr_0\" onmouseover=\"tooltip(this, '{rng.choice(PRECIPITATION)}', '')\"></div>"
+            for _ in times
+        ]),
+    ]
+
+    def measured(low, high, digits=0):
+        values = []
+        for _ in times:
+            value = round(rng.uniform(low, high), digits)
+            values.append(f"<div class=\"t_0\">{value:g}</div><div class=\"t_1\">{value * 1.8 + 32:g}</div>")
+        return values
+
+    rows += [
+        _row("Явления", ["" for _ in times]),
+        _row("Температура", measured(-25, 30)),
+        _row("Ощущается", measured(-30, 30)),
+        _row("Давление", measured(700, 770)),
+        _row("Ветер", measured(0, 15)),
+        _row("Порывы", measured(0, 25)),
+        _row("Направление", ["С" for _ in times]),
+        _row("Влажность", [f"<b>{rng.randint(20, 100)}</b>" for _ in times]),
+        _row("Восход", ["" for _ in times]),
+    ]
+    return ("<html><head><meta charset=\"utf-8\"></head><body>"
+            "<a id=\"ftab-0\">Прогноз</a><table id=\"forecastTable_1_3\">"
+            + "".join(rows) + "</table></body></html>")
+
+
+class FakeRp5:
+    # Локальная замена rp5.ru: отдает сохраненные или синтетические страницы
+    def __init__(self, pages=None, host='127.0.0.1', port=0, delay=0.0):
+        self.pages = pages if pages is not None else {}
+        self.delay = delay
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                if fake.delay:
+                    threading.Event().wait(fake.delay)
+                html = fake.pages.get(self.path) or fake.pages.get('*')
+                if html is None:
+                    self.send_error(404)
+                    return
+                body = html.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    pages = {'*': open(sys.argv[1], encoding='utf-8').read() if len(sys.argv) > 1 else make_snapshot()}
+    with FakeRp5(pages, port=8765) as fake:
+        print(fake.url)
+        fake.thread.join()
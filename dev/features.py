@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from schema import FLOAT
+
+# Порядок признаков, на котором обучена модель (model/train.py)
+FEATURES = ['sin_month', 'cos_month', 'sin_hour', 'cos_hour', 'sin_day_year', 'cos_day_year',
+            'T', 'Po', 'U', 'Ff', 'SZA', 'N', 'W1', 'Nh']
+MEASUREMENTS = ['T', 'Po', 'U', 'Ff', 'SZA', 'N', 'W1', 'Nh']
+
+MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+MONTH_OFFSET = np.concatenate([[0], np.cumsum(MONTH_DAYS)[:-1]])
+
+
+def is_leap(YEAR):
+    return (YEAR % 4 == 0) & ((YEAR % 100 != 0) | (YEAR % 400 == 0))
+
+
+def day_of_year(YEAR, MO, DY):
+    # Номер дня в году без разбора строк; несуществующая дата (31 апреля, 29 февраля
+    # невисокосного года) дает 0, как pd.to_datetime(errors='coerce').fillna(0)
+    YEAR = np.asarray(YEAR, dtype=np.int64)
+    MO = np.asarray(MO, dtype=np.int64)
+    DY = np.asarray(DY, dtype=np.int64)
+
+    valid_month = (MO >= 1) & (MO <= 12)
+    month = np.where(valid_month, MO, 1) - 1
+    leap = is_leap(YEAR)
+    days_in_month = MONTH_DAYS[month] + ((month == 1) & leap)
+    valid = valid_month & (DY >= 1) & (DY <= days_in_month)
+
+    day = MONTH_OFFSET[month] + ((month > 1) & leap) + DY
+    return np.where(valid, day, 0)
+
+
+def build_features(df):
+    # Признаки пишутся сразу в общую матрицу в порядке FEATURES. Матрица в типе схемы:
+    # деревья sklearn все равно приводят признаки к float32, во float32 лишней копии нет
+    MO = df['MO'].to_numpy().astype(int)
+    DY = df['DY'].to_numpy().astype(int)
+    HR = df['HR'].to_numpy().astype(int)
+    day = day_of_year(df['YEAR'].to_numpy().astype(int), MO, DY)
+
+    X = np.empty((len(df), len(FEATURES)), dtype=FLOAT)
+    X[:, 0] = np.sin(2 * np.pi * MO / 12)
+    X[:, 1] = np.cos(2 * np.pi * MO / 12)
+    X[:, 2] = np.sin(2 * np.pi * HR / 24)
+    X[:, 3] = np.cos(2 * np.pi * HR / 24)
+    X[:, 4] = np.sin(2 * np.pi * day / 365)
+    X[:, 5] = np.cos(2 * np.pi * day / 365)
+    for i, column in enumerate(MEASUREMENTS, start=6):
+        X[:, i] = df[column].to_numpy(dtype=FLOAT)
+
+    return pd.DataFrame(X, columns=FEATURES, copy=False)
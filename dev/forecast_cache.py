@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future
+
+from parser import URL, parse_weather
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(script_dir, 'cache')
+
+# Прогноз rp5 обновляется несколько раз в сутки, поэтому час - разумное время жизни
+TTL = float(os.environ.get('SOLAR_FORECAST_TTL', 3600))
+# После истечения TTL еще столько секунд отдаем старый прогноз, обновляя его в фоне
+STALE_TTL = float(os.environ.get('SOLAR_FORECAST_STALE_TTL', 3 * 3600))
+
+logger = logging.getLogger('solar.forecast_cache')
+
+
+class ForecastCache:
+    def __init__(self, ttl=TTL, stale_ttl=STALE_TTL, cache_dir=CACHE_DIR):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+        self._memory = {}
+        self._refreshing = set()
+        # Загрузки при промахе: параллельные запросы того же адреса ждут одну загрузку
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _disk_path(self, site):
+        name = hashlib.sha1(site.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{name}.pkl')
+
+    def _load(self, site):
+        entry = self._memory.get(site)
+        if entry is not None or self.cache_dir is None:
+            return entry
+        try:
+            with open(self._disk_path(site), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if entry.get('site') != site:
+            return None
+        self._memory[site] = entry
+        return entry
+
+    def _store(self, site, df):
+        entry = {'site': site, 'fetched_at': time.time(), 'df': df}
+        with self._lock:
+            self._memory[site] = entry
+        if self.cache_dir is None:
+            return entry
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._disk_path(site)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+        return entry
+
+    def _refresh(self, site, fetch):
+        try:
+            self._store(site, fetch())
+        except Exception as e:
+            # Старый прогноз продолжает отдаваться; ошибка видна в логе, stats() и status()
+            logger.warning("Не удалось обновить прогноз %s: %s", site, e)
+            with self._lock:
+                self.refresh_errors += 1
+                entry = self._memory.get(site)
+                if entry is not None:
+                    entry['last_error'] = str(e)
+                    entry['failed_at'] = time.time()
+                    entry['failures'] = entry.get('failures', 0) + 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(site)
+
+    def get(self, site, fetch):
+        with self._lock:
+            entry = self._load(site)
+            age = time.time() - entry['fetched_at'] if entry is not None else None
+
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                return entry['df'].copy()
+
+            if age is not None and age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if site not in self._refreshing:
+                    self._refreshing.add(site)
+                    threading.Thread(target=self._refresh, args=(site, fetch), daemon=True).start()
+                return entry['df'].copy()
+
+            loading = self._loading.get(site)
+            if loading is None:
+                self.misses += 1
+                loading = self._loading[site] = Future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            # Ошибка загрузки передается всем ожидавшим ее запросам
+            return loading.result()['df'].copy()
+
+        try:
+            entry = self._store(site, fetch())
+        except BaseException as e:
+            loading.set_exception(e)
+            raise
+        else:
+            loading.set_result(entry)
+        finally:
+            with self._lock:
+                self._loading.pop(site, None)
+        return entry['df'].copy()
+
+    def fetched_at(self, site):
+        with self._lock:
+            entry = self._load(site)
+        return entry['fetched_at'] if entry is not None else None
+
+    def status(self, site):
+        # Возраст прогноза и последняя ошибка фонового обновления
+        with self._lock:
+            entry = self._load(site)
+            if entry is None:
+                return None
+            return {
+                'age': time.time() - entry['fetched_at'],
+                'last_error': entry.get('last_error'),
+                'failed_at': entry.get('failed_at'),
+                'failures': entry.get('failures', 0),
+            }
+
+    def invalidate(self, site=None):
+        with self._lock:
+            if site is not None:
+                self._memory.pop(site, None)
+                paths = [self._disk_path(site)] if self.cache_dir is not None else []
+            else:
+                self._memory.clear()
+                paths = []
+                if self.cache_dir is not None and os.path.isdir(self.cache_dir):
+                    paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                             if name.endswith('.pkl')]
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'refresh_errors': self.refresh_errors}
+
+
+forecast_cache = ForecastCache()
+
+
+def get_forecast(url=URL, backend=None, cache=forecast_cache):
+    return cache.get(url, lambda: parse_weather(url=url, backend=backend))
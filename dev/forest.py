@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+CHUNK_SIZE = 2048
+
+
+def _forests(model):
+    # MultiOutputRegressor(RandomForestRegressor) - по лесу на каждую целевую переменную
+    if hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'estimators_'):
+        return [forest.estimators_ for forest in model.estimators_]
+    if getattr(model, 'n_outputs_', 1) > 1:
+        raise ValueError("Поддерживаются только одномерные деревья (MultiOutputRegressor)")
+    return [model.estimators_]
+
+
+def _bfs_order(left, right):
+    # Нумерация узлов по уровням: дети каждого узла идут подряд, правый = левый + 1
+    order = [np.zeros(1, dtype=np.intp)]
+    frontier = order[0]
+    while True:
+        internal = frontier[left[frontier] != -1]
+        if not internal.size:
+            break
+        frontier = np.stack([left[internal], right[internal]], axis=1).ravel()
+        order.append(frontier)
+    order = np.concatenate(order)
+    new_id = np.empty_like(order)
+    new_id[order] = np.arange(order.size)
+    return order, new_id
+
+
+def _float32_threshold(threshold):
+    # x_float32 <= t_float64 эквивалентно x <= наибольшего float32, не превосходящего t
+    result = threshold.astype(np.float32)
+    above = result.astype(np.float64) > threshold
+    result[above] = np.nextafter(result[above], np.float32(-np.inf))
+    return result
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _leaves_compiled(X, roots, feature, threshold, child, missing_left):
+        n = X.shape[0]
+        leaves = np.empty((roots.size, n), dtype=np.intp)
+        # Параллельно по деревьям: узлы одного дерева остаются в кэше процессора
+        for t in numba.prange(roots.size):
+            for i in range(n):
+                node = roots[t]
+                while child[node] >= 0:
+                    x = X[i, feature[node]]
+                    if x <= threshold[node] or (np.isnan(x) and missing_left[node]):
+                        node = child[node]
+                    else:
+                        node = child[node] + 1
+                leaves[t, i] = node
+        return leaves
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, child, missing_left, value, roots, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.child = child
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.n_features = n_features
+
+    @classmethod
+    def from_estimator(cls, model):
+        feature, threshold, child, missing_left, value = [], [], [], [], []
+        roots = []
+        offset = 0
+        for trees in _forests(model):
+            target_roots = []
+            for estimator in trees:
+                tree = estimator.tree_
+                order, new_id = _bfs_order(tree.children_left, tree.children_right)
+                left = tree.children_left[order]
+                leaf = left == -1
+
+                feature.append(np.where(leaf, 0, tree.feature[order]).astype(np.int32))
+                threshold.append(_float32_threshold(tree.threshold[order]))
+                child.append(np.where(leaf, -1, new_id[np.where(leaf, 0, left)] + offset).astype(np.int32))
+                if hasattr(tree, 'missing_go_to_left'):
+                    missing_left.append(np.asarray(tree.missing_go_to_left, dtype=bool)[order])
+                else:
+                    missing_left.append(np.zeros(order.size, dtype=bool))
+                value.append(tree.value[order, 0, 0].astype(np.float64))
+
+                target_roots.append(offset)
+                offset += order.size
+            roots.append(target_roots)
+
+        return cls(
+            feature=np.concatenate(feature),
+            threshold=np.concatenate(threshold),
+            child=np.concatenate(child),
+            missing_left=np.concatenate(missing_left),
+            value=np.concatenate(value),
+            roots=np.array(roots, dtype=np.int32),
+            n_features=int(model.n_features_in_),
+        )
+
+    def _leaves(self, X):
+        # Обход всех деревьев сразу; пары (дерево, строка), дошедшие до листа, выбывают из активного набора
+        feature = np.asarray(self.feature)
+        threshold = np.asarray(self.threshold)
+        child = np.asarray(self.child)
+        missing_left = np.asarray(self.missing_left)
+        check_missing = missing_left.any()
+
+        n = len(X)
+        X = np.ascontiguousarray(X).ravel()
+        roots = np.asarray(self.roots).ravel().astype(np.intp)
+        leaves = np.repeat(roots, n)
+        active = np.arange(leaves.size)
+        nodes = leaves.copy()
+        offsets = np.tile(np.arange(n, dtype=np.intp) * self.n_features, roots.size)
+        children = child.take(nodes)
+
+        while nodes.size:
+            done = children < 0
+            if done.any():
+                leaves[active[done]] = nodes[done]
+                keep = ~done
+                active, nodes, offsets, children = active[keep], nodes[keep], offsets[keep], children[keep]
+            x = X.take(offsets + feature.take(nodes))
+            go_right = ~(x <= threshold.take(nodes))
+            if check_missing:
+                go_right &= ~(np.isnan(x) & missing_left.take(nodes))
+            nodes = children + go_right
+            children = child.take(nodes)
+        return leaves.reshape(roots.size, n)
+
+    def predict_trees(self, X, n_jobs=None):
+        # Результат: (число целевых переменных, число деревьев, число строк)
+        X = np.asarray(X, dtype=np.float32)
+        if numba is not None:
+            if n_jobs:
+                numba.set_num_threads(min(n_jobs, numba.config.NUMBA_NUM_THREADS))
+            leaves = _leaves_compiled(
+                np.ascontiguousarray(X), np.asarray(self.roots).ravel().astype(np.intp),
+                np.asarray(self.feature), np.asarray(self.threshold),
+                np.asarray(self.child), np.asarray(self.missing_left)
+            )
+            return self.value[leaves].reshape(self.roots.shape + (len(X),))
+
+        chunks = [X[start:start + CHUNK_SIZE] for start in range(0, len(X), CHUNK_SIZE)]
+
+        n_jobs = n_jobs or min(len(chunks), os.cpu_count() or 1)
+        if n_jobs > 1:
+            with ThreadPoolExecutor(n_jobs) as pool:
+                leaves = list(pool.map(self._leaves, chunks))
+        else:
+            leaves = [self._leaves(chunk) for chunk in chunks]
+
+        if leaves:
+            leaves = np.concatenate(leaves, axis=1)
+        else:
+            leaves = np.empty((self.roots.size, 0), dtype=np.int32)
+        return self.value[leaves].reshape(self.roots.shape + (len(X),))
+
+    def predict(self, X, n_jobs=None):
+        return self.predict_trees(X, n_jobs=n_jobs).mean(axis=1).T
+
+
+def check_parity(model, flat, X):
+    # Максимальное расхождение с предсказанием sklearn
+    return float(np.max(np.abs(model.predict(X) - flat.predict(X)), initial=0.0))
@@ -0,0 +1,136 @@
+import re
+from html import escape
+from html.parser import HTMLParser
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+             'meta', 'param', 'source', 'track', 'wbr'}
+
+# Открывающий тег неявно закрывает незакрытые ячейки/строки, как в браузере
+IMPLIED_END = {'td': ('td', 'th'), 'th': ('td', 'th'), 'tr': ('td', 'th', 'tr')}
+
+# У rp5 значения в разных единицах лежат рядом: класс *_0 показан, *_1, *_2... скрыты
+HIDDEN_CLASS = re.compile(r'_[1-9]\d*$')
+
+
+class Node:
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs or [])
+        self.parent = parent
+        self.children = []
+
+    @property
+    def classes(self):
+        return (self.attrs.get('class') or '').split()
+
+    def iter(self, tag=None):
+        for child in self.children:
+            if isinstance(child, Node):
+                if tag is None or child.tag == tag:
+                    yield child
+                yield from child.iter(tag)
+
+    def find_all(self, tag):
+        return list(self.iter(tag))
+
+    def find_class(self, name):
+        for node in self.iter():
+            if name in node.classes:
+                return node
+        return None
+
+    def is_hidden(self):
+        style = (self.attrs.get('style') or '').replace(' ', '').lower()
+        if 'display:none' in style:
+            return True
+        return self.tag in ('div', 'span') and any(HIDDEN_CLASS.search(c) for c in self.classes)
+
+    def _text_parts(self, parts):
+        for child in self.children:
+            if isinstance(child, Node):
+                if child.tag == 'br':
+                    parts.append('\n')
+                elif not child.is_hidden() and child.tag not in ('script', 'style'):
+                    child._text_parts(parts)
+            else:
+                parts.append(child)
+
+    @property
+    def text(self):
+        # Аналог WebElement.text: только видимый текст, пробелы схлопнуты
+        parts = []
+        self._text_parts(parts)
+        lines = ''.join(parts).replace('\xa0', ' ').split('\n')
+        lines = [' '.join(line.split()) for line in lines]
+        return '\n'.join(line for line in lines if line)
+
+    @property
+    def inner_html(self):
+        return ''.join(
+            child.outer_html if isinstance(child, Node)
+            else escape(child, quote=False).replace('\xa0', '&nbsp;')
+            for child in self.children
+        )
+
+    @property
+    def outer_html(self):
+        attrs = ''.join(
+            f' {name}' if value is None
+            else ' {}="{}"'.format(name, value.replace('&', '&amp;').replace('"', '&quot;').replace('\xa0', '&nbsp;'))
+            for name, value in self.attrs.items()
+        )
+        if self.tag in VOID_TAGS:
+            return f'<{self.tag}{attrs}>'
+        return f'<{self.tag}{attrs}>{self.inner_html}</{self.tag}>'
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#document')
+        self.current = self.root
+        self.closed = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.closed:
+            return
+        if tag in IMPLIED_END:
+            while self.current.tag in IMPLIED_END[tag]:
+                self.current = self.current.parent
+        node = Node(tag, attrs, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        if self.closed:
+            return
+        self.current.children.append(Node(tag, attrs, self.current))
+
+    def handle_endtag(self, tag):
+        if self.closed:
+            return
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is self.root:
+            return
+        self.current = node.parent
+        if self.current is self.root:
+            self.closed = True
+
+    def handle_data(self, data):
+        if not self.closed:
+            self.current.children.append(data)
+
+
+def find_table(html, table_id):
+    # Разбираем только нужную таблицу, а не всю страницу
+    match = re.search(r'<table\b[^>]*\bid\s*=\s*["\']?' + re.escape(table_id) + r'\b', html)
+    if not match:
+        return None
+    builder = _TreeBuilder()
+    builder.feed(html[match.start():])
+    builder.close()
+    tables = builder.root.find_all('table')
+    return tables[0] if tables else None
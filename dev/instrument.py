@@ -0,0 +1,181 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+# Пиковая память через tracemalloc замедляет расчет в разы, поэтому включается отдельно
+MEMORY = os.environ.get('SOLAR_INSTRUMENT_MEMORY', '') not in ('', '0')
+
+_sinks = []
+_local = threading.local()
+_null = contextlib.nullcontext()
+_lock = threading.Lock()
+
+
+class LogSink:
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('solar.instrument')
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, format_record(record))
+
+
+class JsonLinesSink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, record):
+        self.callback(record)
+
+
+def add_sink(sink):
+    with _lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _recorders():
+    return getattr(_local, 'recorders', None)
+
+
+def stage(name):
+    # Без приемников и записи в текущем потоке возвращается пустой контекст: замеры не делаются
+    if not _sinks and not _recorders():
+        return _null
+    return _Stage(name)
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = _stack()
+        self.path = '/'.join([entry.name for entry in stack] + [self.name])
+        self.memory = MEMORY
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            # Пик внешнего этапа сохраняется до сброса счетчика внутренним
+            if stack and stack[-1].memory:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = self.peak = current
+        stack.append(self)
+        self.start_cpu = time.thread_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.thread_time() - self.start_cpu
+        stack = _stack()
+        stack.pop()
+
+        record = {
+            'stage': self.path,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'peak_bytes': None,
+            'ok': exc_type is None,
+            'time': time.time(),
+        }
+        if self.memory and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            record['peak_bytes'] = self.peak - self.start_memory
+            if stack and stack[-1].memory:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+
+        _emit(record)
+        return False
+
+
+def _emit(record):
+    for sink in list(_sinks):
+        sink(record)
+    for records in _recorders() or ():
+        records.append(record)
+
+
+def report(name, wall_s, cpu_s=None, **fields):
+    # Замер, который не укладывается в один блок with: например, время от запуска GUI до показа окна
+    record = {
+        'stage': name,
+        'wall_s': wall_s,
+        'cpu_s': cpu_s,
+        'peak_bytes': None,
+        'ok': True,
+        'time': time.time(),
+    }
+    record.update(fields)
+    _emit(record)
+    return record
+
+
+@contextlib.contextmanager
+def recording():
+    # Собирает замеры этапов, выполненных в текущем потоке (например, в Worker для GUI)
+    records = []
+    recorders = _recorders()
+    if recorders is None:
+        recorders = _local.recorders = []
+    recorders.append(records)
+    try:
+        yield records
+    finally:
+        recorders.remove(records)
+
+
+def format_record(record):
+    text = f"{record['stage']}: {record['wall_s']:.3f} с"
+    if record['cpu_s'] is not None:
+        text += f", CPU {record['cpu_s']:.3f} с"
+    if record['peak_bytes'] is not None:
+        text += f", пик {record['peak_bytes'] / 2 ** 20:.1f} МБ"
+    return text
+
+
+def format_breakdown(records):
+    # Этапы в порядке начала: вложенные этапы завершаются раньше внешних
+    records = sorted(records, key=lambda record: record['time'] - record['wall_s'])
+    lines = []
+    for record in records:
+        depth = record['stage'].count('/')
+        lines.append('    ' * depth + format_record(dict(record, stage=record['stage'].rsplit('/', 1)[-1])))
+    return '\n'.join(lines)
+
+
+# SOLAR_INSTRUMENT_LOG=1 - замеры в журнал, SOLAR_INSTRUMENT_JSONL=<файл> - в JSON lines
+if os.environ.get('SOLAR_INSTRUMENT_LOG', '') not in ('', '0'):
+    add_sink(LogSink())
+if os.environ.get('SOLAR_INSTRUMENT_JSONL'):
+    add_sink(JsonLinesSink(os.environ['SOLAR_INSTRUMENT_JSONL']))
@@ -1,8 +1,12 @@
-from parser import parse_weather
-from calc import calc_power
-import pandas as pd
+import time
+# Отсчет времени до показа окна и до первого результата
+STARTED = time.perf_counter()
+
+from retry import Cancelled, TransientError, is_transient, run_with_retry
+from instrument import format_breakdown, recording, report, stage
 import sys
 import os
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
     QCheckBox, QFormLayout, QPushButton, QLabel, QFrame,
@@ -10,57 +14,114 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, QTimer, QSize, QThread, pyqtSignal, QObject
 from PyQt5.QtGui import QDoubleValidator, QMovie
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.dates
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+
+# pandas, sklearn (через pipeline), selenium и matplotlib импортируются при первом использовании:
+# окно появляется без них, а warm_up загружает их в фоне сразу после показа окна
+
+
+def warm_up():
+    # Модель и таблицы геометрии готовы к первому нажатию "Рассчитать"; ошибка загрузки
+    # здесь не показывается - она повторится и будет выведена при расчете
+    try:
+        with stage('startup/warm_up'):
+            import matplotlib.dates
+            import matplotlib.backends.backend_qt5agg
+            import matplotlib.figure
+            import forecast_cache
+            from registry import get_model
+            from tables import load_tables
+            from pipeline import pipeline
+
+            load_tables()
+            get_model()
+    except Exception:
+        pass
+
 
 class Worker(QObject):
     finished = pyqtSignal()
     result_ready = pyqtSignal(object)
+    forecast_ready = pyqtSignal(object)
     error_occurred = pyqtSignal(str)
     warning_occurred = pyqtSignal(str)
+    timings_ready = pyqtSignal(str)
 
-    def __init__(self, params):
+    def __init__(self, params, forecast=None):
         super().__init__()
+        # forecast - уже загруженный прогноз: пересчет с новыми параметрами панели без загрузки
         self.params = params
+        self.forecast = forecast
+        self._cancel = threading.Event()
+        self.timings = []
+
+    def cancel(self):
+        self._cancel.set()
+
+    def fetch_weather(self):
+        # Вызывается в отдельном потоке run_with_retry, поэтому замеры собираются здесь
+        from forecast_cache import get_forecast
+
+        try:
+            with recording() as records, stage('weather'):
+                df = get_forecast()
+            self.timings.extend(records)
+        except Exception as e:
+            # Повторяются только сетевые ошибки и ошибки браузера; сломанная разметка rp5
+            # или отсутствие таблицы сразу показываются пользователю
+            if is_transient(e):
+                raise TransientError(str(e)) from e
+            raise
+        if df is None:
+            raise TransientError("Пустой прогноз погоды")
+        return df
+
+    def on_retry(self, attempt, error, delay):
+        self.warning_occurred.emit(
+            f"Ошибка при получении данных о погоде. Повтор {attempt + 1} через {delay:.0f} с..."
+        )
 
     def run(self):
-        while True:
-            try:
-                df = parse_weather()
-                if df is None:
-                    self.warning_occurred.emit("Ошибка при получении данных о погоде. Повтор...")
-                    continue
-
-                efficiency = self.params['efficiency']
-                length = self.params['length']
-                width = self.params['width']
-                default_position = self.params['default_position']
-                azimuth = self.params['azimuth']
-                tilt = self.params['tilt']
-
-                power_df = calc_power(
+        from pipeline import pipeline
+
+        try:
+            if self.forecast is not None:
+                df = self.forecast
+            else:
+                df = run_with_retry(self.fetch_weather, cancel_event=self._cancel, on_retry=self.on_retry)
+
+            efficiency = self.params['efficiency']
+            length = self.params['length']
+            width = self.params['width']
+            default_position = self.params['default_position']
+            azimuth = self.params['azimuth']
+            tilt = self.params['tilt']
+
+            with recording() as records:
+                power_df = pipeline.calc_power(
                     df=df,
                     KPD=efficiency / 100,
                     LENGHT=length,
                     WIDTH=width,
                     optim=default_position,
                     beta=tilt,
-                    y=azimuth
+                    y=azimuth,
+                    tracking=self.params['tracking'],
+                    stow_wind=self.params['stow_wind']
                 )
+            self.timings.extend(records)
 
-                if power_df is None:
-                    self.warning_occurred.emit("Ошибка парсинга. Повтор...")
-                    continue
-
+            if not self._cancel.is_set():
+                self.forecast_ready.emit(df)
                 self.result_ready.emit(power_df)
-                break
+                self.timings_ready.emit(format_breakdown(self.timings))
 
-            except Exception as e:
-                self.warning_occurred.emit(f"Ошибка парсинга. Повтор...")
-                continue
+        except Cancelled:
+            self.warning_occurred.emit("Расчет отменен.")
+        except Exception as e:
+            if is_transient(e):
+                self.error_occurred.emit(f"не удалось получить данные о погоде ({e})")
+            else:
+                self.error_occurred.emit(f"ошибка расчета ({e})")
 
         self.finished.emit()
 
@@ -69,6 +130,10 @@ class SolarPanelForm(QWidget):
         super().__init__()
         self.setWindowTitle("Калькулятор выработки солнечной панели")
         self.resize(800, 400)
+        self.calc_started = None
+        self.first_result = None
+        self.startup_text = ''
+        self.recalc_pending = False
         self.init_ui()
 
     def init_ui(self):
@@ -85,10 +150,13 @@ class SolarPanelForm(QWidget):
         self.width_input = QLineEdit()
         self.azimuth_input = QLineEdit()
         self.tilt_input = QLineEdit()
+        self.stow_wind_input = QLineEdit()
+        self.stow_wind_input.setPlaceholderText("не убирать")
 
         for field in [self.efficiency_input, self.length_input,
-                    self.width_input, self.azimuth_input, self.tilt_input]:
+                    self.width_input, self.azimuth_input, self.tilt_input, self.stow_wind_input]:
             field.setValidator(double_validator)
+            field.editingFinished.connect(self.recalculate)
 
         form_layout.addRow("КПД (%)", self.efficiency_input)
         form_layout.addRow("Длина (м)", self.length_input)
@@ -96,11 +164,21 @@ class SolarPanelForm(QWidget):
 
         self.default_position_checkbox = QCheckBox("Оптимальное положение")
         self.default_position_checkbox.stateChanged.connect(self.toggle_azimuth_tilt)
+        self.default_position_checkbox.stateChanged.connect(self.recalculate)
         form_layout.addRow("", self.default_position_checkbox)
 
         form_layout.addRow("Азимут (°)", self.azimuth_input)
         form_layout.addRow("Наклон (°)", self.tilt_input)
 
+        # Следящая система задает положение панели сама: азимут и наклон не нужны
+        self.tracking_selector = QComboBox()
+        for title, mode in (("Нет", 'fixed'), ("Одноосная", 'single'), ("Двухосная", 'dual')):
+            self.tracking_selector.addItem(title, mode)
+        self.tracking_selector.currentIndexChanged.connect(self.toggle_tracking)
+        self.tracking_selector.currentIndexChanged.connect(self.recalculate)
+        form_layout.addRow("Следящая система", self.tracking_selector)
+        form_layout.addRow("Ветер в горизонт (м/с)", self.stow_wind_input)
+
         form_container.addLayout(form_layout)
 
         self.export_button = QPushButton("Выгрузить данные")
@@ -112,9 +190,18 @@ class SolarPanelForm(QWidget):
         self.warning_label = QLabel("")
         self.warning_label.setStyleSheet("color: red;")
         form_container.addWidget(self.warning_label)
+        self.timings_label = QLabel("")
+        self.timings_label.setStyleSheet("color: gray; font-size: 10px;")
+        self.timings_label.setVisible(False)
+        form_container.addWidget(self.timings_label)
         self.calculate_button.clicked.connect(self.show_loading_animation)
         form_container.addWidget(self.calculate_button)
 
+        self.cancel_button = QPushButton("Отмена")
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self.cancel_calculation)
+        form_container.addWidget(self.cancel_button)
+
         main_layout.addLayout(form_container)
 
         self.graph_area = QFrame()
@@ -154,20 +241,26 @@ class SolarPanelForm(QWidget):
         self.loading_label.setMovie(self.movie)
         self.loading_label.setVisible(False)
 
-        self.figure = Figure()
-        self.figure.patch.set_facecolor('#f0f0f0')
-        self.canvas = FigureCanvas(self.figure)
+        # Холст matplotlib создается при первом графике (init_axes)
+        self.figure = None
+        self.canvas = None
+        self.line = None
 
         self.graph_layout = QVBoxLayout()
         self.graph_layout.addWidget(self.day_selector)
         self.graph_layout.addWidget(self.loading_label, alignment=Qt.AlignCenter)
-        self.graph_layout.addWidget(self.canvas)
 
         self.graph_area.setLayout(self.graph_layout)
         main_layout.addWidget(self.graph_area)
 
         self.setLayout(main_layout)
 
+    def on_shown(self):
+        # Вызывается из цикла событий сразу после первой отрисовки окна
+        self.window_record = report('startup/window', time.perf_counter() - STARTED, time.process_time())
+        self.warm_up_thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+        self.warm_up_thread.start()
+
     def toggle_azimuth_tilt(self, state):
         if state == Qt.Checked:
             self.azimuth_input.clear()
@@ -177,10 +270,21 @@ class SolarPanelForm(QWidget):
 
             self.azimuth_input.setStyleSheet("")
             self.tilt_input.setStyleSheet("")
-        else:
+        elif self.tracking_selector.currentData() == 'fixed':
             self.azimuth_input.setDisabled(False)
             self.tilt_input.setDisabled(False)
 
+    def toggle_tracking(self):
+        fixed = self.tracking_selector.currentData() == 'fixed'
+        self.default_position_checkbox.setDisabled(not fixed)
+        if fixed:
+            self.toggle_azimuth_tilt(self.default_position_checkbox.checkState())
+        else:
+            self.azimuth_input.setDisabled(True)
+            self.tilt_input.setDisabled(True)
+            self.azimuth_input.setStyleSheet("")
+            self.tilt_input.setStyleSheet("")
+
     def show_loading_animation(self):
         if not self.validate_inputs():
             self.warning_label.setText("Заполните все поля.")
@@ -190,11 +294,15 @@ class SolarPanelForm(QWidget):
 
         self.day_selector.clear()
         self.export_button.setVisible(False)
+        self.timings_label.setVisible(False)
 
-        self.canvas.setVisible(False)
+        if self.canvas is not None:
+            self.canvas.setVisible(False)
         self.loading_label.setVisible(True)
         self.movie.jumpToFrame(0)
         self.movie.start()
+        self.calculate_button.setEnabled(False)
+        self.cancel_button.setVisible(True)
 
         params = self.get_panel_parameters()
         if not params:
@@ -202,31 +310,79 @@ class SolarPanelForm(QWidget):
             self.hide_loading_animation()
             return
 
+        if self.first_result is None:
+            self.calc_started = time.perf_counter()
+
+        self.start_worker(params)
+
+    def start_worker(self, params, forecast=None):
+        self.calculate_button.setEnabled(False)
         self.thread = QThread()
-        self.worker = Worker(params)
+        self.worker = Worker(params, forecast)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.run)
         self.worker.finished.connect(self.thread.quit)
         self.worker.finished.connect(self.worker.deleteLater)
         self.thread.finished.connect(self.thread.deleteLater)
+        self.worker.forecast_ready.connect(self.set_forecast)
         self.worker.result_ready.connect(self.handle_parse_result)
         self.worker.error_occurred.connect(self.handle_error)
         self.worker.warning_occurred.connect(self.handle_warning)
-        self.thread.finished.connect(self.hide_loading_animation)
+        self.worker.timings_ready.connect(self.show_timings)
+        self.thread.finished.connect(self.worker_finished)
 
         self.thread.start()
 
+    def worker_finished(self):
+        self.hide_loading_animation()
+        if self.recalc_pending:
+            self.recalc_pending = False
+            self.recalculate()
+
+    def set_forecast(self, df):
+        self.forecast_df = df
+
+    def recalculate(self):
+        # Изменение параметров панели после расчета: прогноз и предсказание модели берутся
+        # из кэша pipeline, пересчитываются только этапы после них. Промах кэша (новый прогноз,
+        # вытесненная запись) означает предсказание модели, поэтому пересчет идет в потоке Worker
+        if not hasattr(self, 'forecast_df'):
+            return
+        if not self.calculate_button.isEnabled():
+            # Идет расчет: пересчет с последними параметрами запускается после него
+            self.recalc_pending = True
+            return
+        params = self.get_panel_parameters()
+        if not params:
+            return
+        self.start_worker(params, self.forecast_df)
+
+    def cancel_calculation(self):
+        if hasattr(self, 'worker'):
+            self.worker.cancel()
+        self.cancel_button.setVisible(False)
+
     def handle_error(self, message):
         self.warning_label.setText(f"Ошибка: {message}")
     
     def handle_warning(self, message):
         self.warning_label.setText(message)
 
+    def show_timings(self, text):
+        if self.startup_text:
+            text = self.startup_text + '\n' + text
+            self.startup_text = ''
+        self.timings_label.setText(text)
+        self.timings_label.setVisible(True)
+
     def hide_loading_animation(self):
         self.movie.stop()
         self.loading_label.setVisible(False)
-        self.canvas.setVisible(True)
+        if self.canvas is not None:
+            self.canvas.setVisible(True)
+        self.calculate_button.setEnabled(True)
+        self.cancel_button.setVisible(False)
 
     def validate_inputs(self):
         fields = [
@@ -235,7 +391,7 @@ class SolarPanelForm(QWidget):
             self.width_input
         ]
 
-        if not self.default_position_checkbox.isChecked():
+        if not self.default_position_checkbox.isChecked() and self.tracking_selector.currentData() == 'fixed':
             fields.extend([self.azimuth_input, self.tilt_input])
 
         all_filled = True
@@ -253,7 +409,9 @@ class SolarPanelForm(QWidget):
             efficiency = float(self.efficiency_input.text())
             length = float(self.length_input.text())
             width = float(self.width_input.text())
-            default_position = self.default_position_checkbox.isChecked()
+            tracking = self.tracking_selector.currentData()
+            default_position = self.default_position_checkbox.isChecked() or tracking != 'fixed'
+            stow_wind = self.stow_wind_input.text().strip()
 
             if default_position:
                 azimuth = None
@@ -268,54 +426,101 @@ class SolarPanelForm(QWidget):
                 'width': width,
                 'default_position': default_position,
                 'azimuth': azimuth,
-                'tilt': tilt
+                'tilt': tilt,
+                'tracking': tracking,
+                'stow_wind': float(stow_wind) if stow_wind else None
             }
         except ValueError:
             return None
         
-    def plot_wel_for_selected_day(self):
-        selected_index = self.day_selector.currentIndex()
-        if selected_index < 0 or not hasattr(self, 'power_df'):
-            return
+    def init_axes(self):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.dates
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        self.figure = Figure()
+        self.figure.patch.set_facecolor('#f0f0f0')
+        self.canvas = FigureCanvas(self.figure)
+        self.graph_layout.addWidget(self.canvas)
 
-        selected_day = self.unique_days[selected_index]
-        df_day = self.power_df[self.power_df['datetime'].dt.date == selected_day]
+        # Оси и линия создаются один раз, при смене дня меняются только данные линии
+        self.ax = self.figure.add_subplot(111)
+        self.line, = self.ax.plot([], [], marker='o', linestyle='-')
+        self.ax.set_ylabel("кВт*ч")
+        self.ax.grid(True)
 
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
+        self.ax.xaxis_date()
+        self.ax.xaxis.set_major_formatter(matplotlib.dates.DateFormatter('%H:%M'))
+        self.ax.tick_params(axis='x', labelrotation=45)
+        self.ax.margins(x=0)
 
-        ax.plot(df_day['datetime'], df_day['Wel'], marker='o', linestyle='-')
-        ax.set_ylabel("кВт*ч")
-        ax.grid(True)
+    def plot_wel_for_selected_day(self):
+        selected_index = self.day_selector.currentIndex()
+        if selected_index < 0 or not hasattr(self, 'day_groups'):
+            return
 
-        ax.xaxis.set_major_formatter(matplotlib.dates.DateFormatter('%H:%M'))
+        x, y = self.day_groups[self.unique_days[selected_index]]
 
-        for label in ax.get_xticklabels():
-            label.set_rotation(45)
-        ax.margins(x=0)
+        if self.line is None:
+            self.init_axes()
+        self.line.set_data(x, y)
+        self.ax.relim()
+        self.ax.autoscale_view()
 
-        self.canvas.draw()
+        self.canvas.draw_idle()
     
-    def handle_parse_result(self, power_df):
-        self.power_df = power_df
+    def report_first_result(self):
+        # Время от нажатия "Рассчитать" до первого графика: с прогретой моделью и таблицами
+        # оно определяется загрузкой прогноза и расчетом
+        now = time.perf_counter()
+        self.first_result = report('startup/first_result', now - self.calc_started,
+                                   since_start_s=now - STARTED)
+        window = getattr(self, 'window_record', None)
+        self.startup_text = (
+            f"Запуск: окно {window['wall_s']:.2f} с, " if window else "Запуск: "
+        ) + f"первый результат {self.first_result['wall_s']:.2f} с"
 
-        power_df['datetime'] = pd.to_datetime(
-            power_df['YEAR'].astype(str) + '-' +
-            power_df['MO'].astype(str) + '-' +
-            power_df['DY'].astype(str) + ' ' +
-            power_df['HR'].astype(str) + ':00'
-        )
+    def handle_parse_result(self, power_df):
+        import matplotlib.dates
+        import pandas as pd
 
-        self.unique_days = sorted(power_df['datetime'].dt.date.unique())
+        self.power_df = power_df
 
-        self.day_selector.clear()
-        for day in self.unique_days:
-            self.day_selector.addItem(day.strftime("%Y-%m-%d"))
+        power_df['datetime'] = pd.to_datetime(pd.DataFrame({
+            'year': power_df['YEAR'].astype(int),
+            'month': power_df['MO'].astype(int),
+            'day': power_df['DY'].astype(int),
+            'hour': power_df['HR'].astype(int),
+        }))
+
+        # Данные по дням раскладываются один раз: x - даты matplotlib, y - выработка
+        x = matplotlib.dates.date2num(power_df['datetime'].to_numpy())
+        y = power_df['Wel'].to_numpy(dtype=float)
+        days = power_df['datetime'].dt.date
+        groups = days.groupby(days).indices
+        unique_days = sorted(groups)
+        self.day_groups = {day: (x[groups[day]], y[groups[day]]) for day in unique_days}
+
+        if unique_days != getattr(self, 'unique_days', None) or self.day_selector.count() != len(unique_days):
+            selected_index = self.day_selector.currentIndex()
+            self.unique_days = unique_days
+
+            self.day_selector.blockSignals(True)
+            self.day_selector.clear()
+            for day in self.unique_days:
+                self.day_selector.addItem(day.strftime("%Y-%m-%d"))
+            self.day_selector.setCurrentIndex(selected_index if 0 <= selected_index < len(unique_days) else 0)
+            self.day_selector.blockSignals(False)
 
         self.plot_wel_for_selected_day()
 
         self.export_button.setVisible(True)
 
+        if self.first_result is None and self.calc_started is not None:
+            self.report_first_result()
+
     def export_to_csv(self):
         if not hasattr(self, 'power_df'):
             self.warning_label.setText("Нет данных для выгрузки.")
@@ -327,16 +532,21 @@ class SolarPanelForm(QWidget):
             self,
             "Сохранить файл как",
             default_filename,
-            "CSV файлы (*.csv);;Все файлы (*)"
+            "CSV файлы (*.csv);;Parquet файлы (*.parquet);;Arrow файлы (*.arrow);;Все файлы (*)"
         )
 
         if not file_path:
             return
+
+        from sinks import make_sink
+
         try:
             cols_to_save = ['YEAR', 'MO', 'DY', 'HR', 'Wel']
-            filtered_df = self.power_df[cols_to_save]
-
-            filtered_df.to_csv(file_path, index=False, encoding='utf-8-sig')
+            sink = make_sink(file_path, columns=cols_to_save, encoding='utf-8-sig')
+            try:
+                sink.write(self.power_df)
+            finally:
+                sink.close()
 
             self.warning_label.setText(
                 f'<span style="color: green;">Файл успешно сохранён:<br>{file_path}</span>'
@@ -350,4 +560,5 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = SolarPanelForm()
     window.show()
+    QTimer.singleShot(0, window.on_shown)
     sys.exit(app.exec_())
\ No newline at end of file
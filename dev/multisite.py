@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from calc import add_radiation, apply_physics, build_features, prepare_forecast
+from forecast_cache import get_forecast
+from parser import BACKEND
+from registry import get_model
+
+MAX_WORKERS = 8
+
+# Ключи площадки, которые передаются в solar_geometry
+GEOMETRY_KEYS = ('lantitude', 'longitude', 'tz', 'noon_hour')
+
+
+def site_params(site):
+    return {key: site[key] for key in GEOMETRY_KEYS if key in site}
+
+
+def fetch_forecasts(sites, max_workers=MAX_WORKERS, fetch=None):
+    # Прогнозы загружаются параллельно: общее время ~ время самой медленной площадки
+    fetch = fetch or (lambda site: get_forecast(url=site['url'], backend=site.get('backend')))
+    forecasts, errors = {}, {}
+    if not sites:
+        return forecasts, errors
+
+    workers = min(max_workers, len(sites))
+    if any((site.get('backend') or BACKEND) == 'selenium' for site in sites):
+        # По браузеру на поток: с одной сессией Chrome загрузки шли бы по очереди
+        from browser_pool import get_pool
+        get_pool().ensure_size(workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {site['name']: pool.submit(fetch, site) for site in sites}
+        for name, future in futures.items():
+            try:
+                forecasts[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+    return forecasts, errors
+
+
+def predict_sites(forecasts, sites, errors=None):
+    # Признаки всех площадок собираются в одну матрицу: одна модель, один вызов predict.
+    # errors - словарь: площадка с ошибкой подготовки попадает в него и пропускается,
+    # без него ошибка прерывает расчет всех площадок
+    by_name = {site['name']: site for site in sites}
+    prepared, features = {}, []
+    for name, df in forecasts.items():
+        try:
+            df = prepare_forecast(df, site_params(by_name[name]) or None)
+            X = build_features(df)
+        except Exception as e:
+            if errors is None:
+                raise
+            errors[name] = e
+            continue
+        prepared[name] = df
+        features.append(X)
+    if not prepared:
+        return {}
+
+    X = pd.concat(features, ignore_index=True)
+    rf_pred = get_model().predict(X)
+
+    bounds = np.cumsum([0] + [len(df) for df in prepared.values()])
+    return {
+        name: add_radiation(df, rf_pred[start:end])
+        for (name, df), start, end in zip(prepared.items(), bounds[:-1], bounds[1:])
+    }
+
+
+def calc_power_sites(sites, KPD, LENGHT, WIDTH, optim, beta=None, y=None, max_workers=MAX_WORKERS, fetch=None):
+    # sites - список словарей: name, url, lantitude, longitude, tz;
+    # KPD, LENGHT, WIDTH, optim, beta, y в словаре площадки заменяют общие значения
+    forecasts, errors = fetch_forecasts(sites, max_workers=max_workers, fetch=fetch)
+    radiation = predict_sites(forecasts, sites)
+
+    results = {}
+    for site in sites:
+        name = site['name']
+        if name not in radiation:
+            continue
+        results[name] = apply_physics(
+            radiation[name],
+            KPD=site.get('KPD', KPD),
+            LENGHT=site.get('LENGHT', LENGHT),
+            WIDTH=site.get('WIDTH', WIDTH),
+            optim=site.get('optim', optim),
+            beta=site.get('beta', beta),
+            y=site.get('y', y),
+            site=site_params(site),
+        )
+    return results, errors
@@ -0,0 +1,115 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Точные тексты архива rp5 (обучение) и фрагменты текстов прогноза rp5 (parse_weather)
+UNIQUE_PATH = os.path.join(script_dir, '..', 'model', 'data', 'unique.json')
+RULES_PATH = os.path.join(script_dir, 'data', 'weather_to_num.json')
+
+# На rp5 в русских словах встречаются латинские C/c
+LATIN_TO_CYRILLIC = str.maketrans({'C': 'С', 'c': 'с'})
+
+
+def normalize_text(text):
+    return text.translate(LATIN_TO_CYRILLIC).strip()
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compile_contains(conditions):
+    # Одно выражение на все условия: альтернативы проверяются по порядку, как цикл по словарю,
+    # номер сработавшей группы указывает на условие
+    if not conditions:
+        return None
+    alternatives = '|'.join(f'(?=.*?({re.escape(condition)}))' for condition in conditions)
+    return re.compile(f'^(?:{alternatives})', re.I | re.S)
+
+
+class WeatherNormalizer:
+    def __init__(self, exact=None, contains=None):
+        # exact: {колонка: {текст: код}} - сначала точное совпадение;
+        # contains: {колонка: {фрагмент: код}} - затем первый фрагмент, входящий в текст
+        self.exact = exact or {}
+        self.contains = contains or {}
+        self.columns = list(dict.fromkeys(list(self.exact) + list(self.contains)))
+        self._patterns = {column: compile_contains(list(rules)) for column, rules in self.contains.items()}
+        self._values = {column: list(rules.values()) for column, rules in self.contains.items()}
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_files(cls, unique_path=UNIQUE_PATH, rules_path=RULES_PATH):
+        return cls(exact=_load(unique_path), contains=_load(rules_path))
+
+    def _code(self, column, text):
+        exact = self.exact.get(column, {})
+        if text in exact:
+            return exact[text]
+        normalized = normalize_text(text)
+        if normalized in exact:
+            return exact[normalized]
+
+        pattern = self._patterns.get(column)
+        match = pattern.match(normalized) if pattern is not None else None
+        if match is not None:
+            return self._values[column][match.lastindex - 1]
+        # Незнакомый текст остается как есть; числа из него получит pd.to_numeric
+        return normalized
+
+    def code(self, column, text):
+        if not isinstance(text, str):
+            return text
+        key = (column, text)
+        value = self._memo.get(key)
+        if value is None and key not in self._memo:
+            value = self._code(column, text)
+            with self._lock:
+                self._memo[key] = value
+        return value
+
+    def normalize_column(self, column, series):
+        # Каждый уникальный текст разбирается один раз, остальное - индексация массива
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        mapped = np.empty(len(uniques) + 1, dtype=object)
+        mapped[:-1] = [self.code(column, value) for value in uniques]
+        mapped[-1] = np.nan
+        return pd.Series(mapped[codes], index=series.index, name=series.name).infer_objects()
+
+    def apply(self, df, columns=None):
+        for column in columns or self.columns:
+            if column in df.columns:
+                df[column] = self.normalize_column(column, df[column])
+        return df
+
+    def __getstate__(self):
+        # Для ProcessPoolExecutor: блокировка не сериализуется, память уникальных текстов не нужна
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_memo'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+_normalizer = None
+_normalizer_lock = threading.Lock()
+
+
+def get_normalizer():
+    global _normalizer
+    with _normalizer_lock:
+        if _normalizer is None:
+            _normalizer = WeatherNormalizer.from_files()
+        return _normalizer
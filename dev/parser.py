@@ -1,102 +1,101 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 import re
 import pandas as pd
 import os
 from datetime import datetime, timedelta
-import json
+import urllib.parse
+import urllib.request
+from htmltable import find_table
+from instrument import stage
+from normalizer import get_normalizer
+from schema import apply_schema
+
+URL = "https://rp5.ru/Погода_в_Иркутске"
+TABLE_ID = "forecastTable_1_3"
+BACKEND = os.environ.get('SOLAR_WEATHER_BACKEND', 'selenium')
+HTTP_TIMEOUT = 15
+
+
+def parse_weather(url=URL, backend=None, html=None):
+    # html - сохраненная страница rp5: разбор без сети
+    backend = backend or BACKEND
+    with stage('parse_weather'):
+        if html is None and backend == 'http':
+            with stage('fetch'):
+                html = fetch_html(url)
+        if html is not None:
+            with stage('parse_html'):
+                data = parse_forecast_html(html)
+        elif backend == 'selenium':
+            data = _scrape_selenium(url)
+        else:
+            raise ValueError(f"Неизвестный способ загрузки погоды: {backend}")
+        with stage('build_frame'):
+            return _build_frame(data)
+
+
+def fetch_html(url=URL, timeout=HTTP_TIMEOUT):
+    # Кириллица в адресе rp5 должна быть закодирована
+    url = urllib.parse.quote(url, safe=":/?&=%#")
+    request = urllib.request.Request(url, headers={
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+        'Accept-Language': 'ru-RU,ru;q=0.9',
+    })
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        charset = response.headers.get_content_charset() or 'utf-8'
+        return response.read().decode(charset, errors='replace')
 
-def parse_weather():
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--no-sandbox")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
 
-    url = "https://rp5.ru/Погода_в_Иркутске"
-    driver.get(url)
+def _cells(row):
+    return row.find_all('td') or row.find_all('th')
 
-    wait = WebDriverWait(driver, 15)
-    button = wait.until(EC.element_to_be_clickable((By.ID, "ftab-0")))
-    button.click()
 
-    table = wait.until(EC.presence_of_element_located((By.ID, "forecastTable_1_3")))
-    rows = table.find_elements(By.TAG_NAME, "tr")
+def parse_forecast_html(html):
+    table = find_table(html, TABLE_ID)
+    if table is None:
+        raise ValueError(f"Таблица {TABLE_ID} не найдена на странице")
+    rows = table.find_all('tr')
 
     data = []
 
-    hours_raw = rows[1].find_elements(By.TAG_NAME, "td") or rows[1].find_elements(By.TAG_NAME, "th")
-    """for i in hours_raw:
-        print(i.text)"""
+    hours_raw = _cells(rows[1])
     hours = [int(hour.text) for hour in hours_raw[1:-1]]
-
-    months_lib = {"января" : 1, "февраля" : 2, "марта" : 3, "апреля" : 4, "мая" : 5, "июня" : 6, 
-            "июля" : 7, "августа" : 8, "сентября" : 9, "октября" : 10, "ноября" : 11, "декабря" : 12,}
-    cells = rows[0].find_elements(By.TAG_NAME, "td") or rows[0].find_elements(By.TAG_NAME, "th")
-    cells = [txt.text for txt in cells]
-    days = []
-    months = []
-    for cell in cells:
-        date = re.search(r"(\d+)\s+([а-яА-Я]+)", cell)
-        if date:
-            day = int(date.group(1))
-            month = months_lib[date.group(2)]
-            days.append(day)
-            months.append(month)
     data.append(hours)
 
-    cells = rows[2].find_elements(By.TAG_NAME, "td") or rows[2].find_elements(By.TAG_NAME, "th")
     cloud_cover = []
-    clouds = []
     cloud_percentages = []
+    for cell in _cells(rows[2]):
+        cc_0 = cell.find_class('cc_0')
+        if cc_0 is None:
+            continue
+        cc_0 = cc_0.inner_html
 
-    for cell in cells:
-        try:
-            cc_0 = cell.find_element(By.CLASS_NAME, "cc_0").get_attribute("innerHTML")
-
-            teg_b = re.search(r"<b>(.*?)</b>", cc_0)
-            cloud_cover.append(teg_b.group(1) if teg_b else '')
+        teg_b = re.search(r"<b>(.*?)</b>", cc_0)
+        cloud_cover.append(teg_b.group(1) if teg_b else '')
 
-            teg_br = re.search(r"<br/>\((.*?)\)", cc_0)
-            cloud_info = teg_br.group(1).strip('"') if teg_br else ''
+        teg_br = re.search(r"<br/>\((.*?)\)", cc_0)
+        cloud_info = teg_br.group(1).strip('"') if teg_br else ''
 
-            lower = re.search(r"нижнего яруса (\d+)%", cloud_info)
-            middle = re.search(r"среднего яруса (\d+)%", cloud_info)
+        lower = re.search(r"нижнего яруса (\d+)%", cloud_info)
+        middle = re.search(r"среднего яруса (\d+)%", cloud_info)
 
-            if lower:
-                cloud_percentages.append(int(lower.group(1)))
-            elif middle:
-                cloud_percentages.append(int(middle.group(1)))
-            else:
-                cloud_percentages.append(0)
-
-            clouds.append(cloud_info)
-
-        except:
-            pass
+        if lower:
+            cloud_percentages.append(int(lower.group(1)))
+        elif middle:
+            cloud_percentages.append(int(middle.group(1)))
+        else:
+            cloud_percentages.append(0)
 
     data.append(cloud_cover[1:-1])
     cloud_percentages[1:-1] = [x / 100 for x in cloud_percentages[1:-1]]
     data.append(cloud_percentages[1:-1])
 
-    cells = rows[3].find_elements(By.TAG_NAME, "td") or rows[3].find_elements(By.TAG_NAME, "th")
     rainfall = []
-    for cell in cells:
-        try:
-            pr_0 = cell.find_element(By.CLASS_NAME, "pr_0")
-            pr_0 = pr_0.get_attribute("outerHTML")
-            rf = re.search(r"tooltip\(this, '(.*?)'", pr_0)
-            if rf:
-                rainfall.append(rf.group(1))
-            else:
-                rainfall.append('')
-        except:
-            pass
+    for cell in _cells(rows[3]):
+        pr_0 = cell.find_class('pr_0')
+        if pr_0 is None:
+            continue
+        rf = re.search(r"tooltip\(this, '(.*?)'", pr_0.outer_html)
+        rainfall.append(rf.group(1) if rf else '')
     data.append(rainfall[1:-1])
 
     begin_parse = 4
@@ -107,21 +106,39 @@ def parse_weather():
         end_parse -= 1
 
     for i in range(begin_parse, end_parse):
-        raw_data = rows[i].find_elements(By.TAG_NAME, "td") or rows[i].find_elements(By.TAG_NAME, "th")
-        raw_data = [raw.text for raw in raw_data]
+        raw_data = [raw.text for raw in _cells(rows[i])]
         data.append(raw_data[1:-1])
 
-    hum_data = rows[end_parse].find_elements(By.TAG_NAME, "td") or rows[end_parse].find_elements(By.TAG_NAME, "th")
     humidity = []
-    for cell in hum_data:
-        digit = cell.get_attribute("innerHTML")
+    for cell in _cells(rows[end_parse]):
+        digit = cell.inner_html
         teg_b = re.search(r"<b>(.*?)</b>", digit)
-        if teg_b:
-            humidity.append(teg_b.group(1))
-        else:
-            humidity.append(digit)
+        humidity.append(teg_b.group(1) if teg_b else digit)
     data.append(humidity[1:-1])
 
+    return data
+
+
+def save_snapshot(path, url=URL):
+    html = fetch_html(url)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return html
+
+
+def _scrape_selenium(url):
+    # Chrome берется из пула прогретых сессий, таблица забирается одним вызовом скрипта
+    # и разбирается тем же кодом, что и страница, загруженная по HTTP
+    from browser_pool import get_pool
+
+    with get_pool().session() as session:
+        with stage('page_load'):
+            html = session.load_forecast(url, TABLE_ID)
+    with stage('parse_html'):
+        return parse_forecast_html(html)
+
+
+def _build_frame(data):
     df = pd.DataFrame(data).T  
 
     first_zero_hour_index = df[df[0] == 0].index[0]
@@ -161,28 +178,7 @@ def parse_weather():
     columns = ['F','Tt','FF','f']
     df = df.drop(columns, axis=1)
 
-    json_dir = os.path.dirname(os.path.abspath(__file__))
-    json_file = os.path.join(json_dir, "data/weather_to_num.json") 
-    with open(json_file , 'r', encoding='utf-8') as f:
-        replacement_rules = json.load(f)
-
-    def normalize_text(text):
-        replacements = {
-            'C': 'С',
-            'c': 'с',
-        }
-        for latin, cyrillic in replacements.items():
-            text = text.replace(latin, cyrillic)
-        return text.strip()
-
-    def replace_weather_condition(text, condition_dict):
-        text = normalize_text(text)
-        for condition, value in condition_dict.items():
-            if condition.lower() in text.lower():
-                return value
-        return text
-
-    df['W1'] = df['W1'].apply(lambda x: replace_weather_condition(str(x), replacement_rules["W1"]))
-    df['N'] = df['N'].apply(lambda x: replace_weather_condition(str(x), replacement_rules["N"]))
-
-    return df
\ No newline at end of file
+    # Те же коды облачности и явлений, что при обучении на архиве
+    get_normalizer().apply(df, ['W1', 'N'])
+
+    return apply_schema(df)
\ No newline at end of file
@@ -0,0 +1,142 @@
+import numpy as np
+
+from schema import FLOAT
+
+LANTITUDE = 52.3
+
+to_rad = np.pi / 180
+
+# Режимы положения панели: fixed - заданные beta/y (или оптимальные из params.csv),
+# single и dual - одноосная и двухосная следящая система
+FIXED = 'fixed'
+TRACKING_MODES = (FIXED, 'single', 'dual')
+
+
+def incidence(beta, y, delta, w, lantitude=LANTITUDE):
+    # Косинус угла падения прямых лучей на панель. Отдельная функция: синусы и косинусы углов
+    # освобождаются до расчета составляющих радиации
+    sin_beta = np.sin(np.asarray(beta, dtype=FLOAT) * to_rad)
+    cos_beta = np.cos(np.asarray(beta, dtype=FLOAT) * to_rad)
+    sin_y = np.sin(np.asarray(y, dtype=FLOAT) * to_rad)
+    cos_y = np.cos(np.asarray(y, dtype=FLOAT) * to_rad)
+    sin_delta = np.sin(np.asarray(delta, dtype=FLOAT) * to_rad)
+    cos_delta = np.cos(np.asarray(delta, dtype=FLOAT) * to_rad)
+    sin_w = np.sin(np.asarray(w, dtype=FLOAT) * to_rad)
+    cos_w = np.cos(np.asarray(w, dtype=FLOAT) * to_rad)
+    sin_lan = FLOAT(np.sin(lantitude * to_rad))
+    cos_lan = FLOAT(np.cos(lantitude * to_rad))
+
+    with np.errstate(invalid='ignore'):
+        return (sin_beta * (cos_delta * (sin_lan * cos_y * cos_w + sin_y * sin_w) - sin_delta * cos_lan * cos_y)
+                + cos_beta * (cos_delta * cos_lan * cos_w + sin_delta * sin_lan))
+
+
+def tracking_angles(mode, delta, w, lantitude=LANTITUDE):
+    # Положение следящей панели по часу (Duffie, Beckman, гл. 1.7) в обозначениях incidence:
+    # y - азимут от юга, запад положителен. single - горизонтальная ось север-юг, панель
+    # поворачивается с востока на запад; dual - панель перпендикулярна лучам.
+    # Солнце под горизонтом - панель горизонтальна
+    delta = np.asarray(delta, dtype=FLOAT) * to_rad
+    w = np.asarray(w, dtype=FLOAT) * to_rad
+    sin_lan = FLOAT(np.sin(lantitude * to_rad))
+    cos_lan = FLOAT(np.cos(lantitude * to_rad))
+
+    cos_delta = np.cos(delta)
+    sin_delta = np.sin(delta)
+    # cos и sin*sin(азимута) зенитного угла солнца
+    cos_zenith = sin_lan * sin_delta + cos_lan * cos_delta * np.cos(w)
+    east_west = cos_delta * np.sin(w)
+    day = cos_zenith > 0
+
+    if mode == 'single':
+        beta = np.arctan2(np.abs(east_west), cos_zenith)
+        y = np.where(east_west > 0, FLOAT(90), FLOAT(-90))
+    elif mode == 'dual':
+        beta = np.arccos(np.clip(cos_zenith, -1, 1))
+        y = np.arctan2(east_west, (cos_zenith * sin_lan - sin_delta) / cos_lan) / to_rad
+    else:
+        raise ValueError(f"Неизвестный режим слежения: {mode}")
+
+    beta = np.where(day, beta / to_rad, FLOAT(0)).astype(FLOAT, copy=False)
+    y = np.where(day, y, FLOAT(0)).astype(FLOAT, copy=False)
+    return beta, y
+
+
+def panel_position(beta, y, delta, w, Ff, tracking=FIXED, stow_wind=None, lantitude=LANTITUDE):
+    # beta/y панели с учетом слежения и защиты от ветра: при Ff выше stow_wind панель
+    # уходит в горизонт. В режиме fixed beta/y берутся как заданы
+    if tracking != FIXED:
+        beta, y = tracking_angles(tracking, delta, w, lantitude)
+    if stow_wind is not None:
+        stow = np.asarray(Ff, dtype=FLOAT) > np.asarray(stow_wind, dtype=FLOAT)
+        beta = np.where(stow, FLOAT(0), np.asarray(beta, dtype=FLOAT))
+    return beta, y
+
+
+def transpose(diff, dwn, alb, sina, delta, w, beta, y, lantitude=LANTITUDE):
+    # Радиация на наклонную плоскость панели: зависит только от геометрии и положения панели.
+    # Расчет идет в типе схемы (float32 в компактной раскладке)
+    diff = np.asarray(diff, dtype=FLOAT)
+    dwn = np.asarray(dwn, dtype=FLOAT)
+    sina = np.asarray(sina, dtype=FLOAT)
+    alb = np.asarray(alb, dtype=FLOAT)
+
+    cos = incidence(beta, y, delta, w, lantitude)
+    cos_beta = np.cos(np.asarray(beta, dtype=FLOAT) * to_rad)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rad_pram = dwn - diff
+
+        Hnorm = rad_pram / sina
+        Hbt = Hnorm * cos
+        Hdt = diff * (1 + cos_beta) / 2
+        Hrt = alb * dwn * (1 - cos_beta) / 2
+        Hgt = Hbt + Hdt + Hrt
+
+    return {
+        'rad_pram': rad_pram,
+        'cos': cos,
+        'Hnorm': Hnorm,
+        'Hbt': Hbt,
+        'Hdt': Hdt,
+        'Hrt': Hrt,
+        'Hgt': Hgt,
+    }
+
+
+def thermal(Hgt, T, Ff):
+    # Температура модуля и мощность на единицу площади при КПД 100%
+    T = np.asarray(T, dtype=FLOAT)
+    Ff = np.asarray(Ff, dtype=FLOAT)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Tmod = Hgt * np.exp(-3.47 - 0.075 * Ff) + T
+        Tyach = Tmod + (Hgt / 1000) * 2.5
+        W = Hgt * (1 - 0.47 * (Tyach - 25) / 100)
+
+    return {
+        'Tmod': Tmod,
+        'Tyach': Tyach,
+        'W': W,
+    }
+
+
+def electrical(W, sina, KPD, LENGHT, WIDTH):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Wel = (np.asarray(W, dtype=FLOAT) * np.asarray(KPD, dtype=FLOAT)
+               * np.asarray(LENGHT, dtype=FLOAT) * np.asarray(WIDTH, dtype=FLOAT))
+        return np.where((Wel < 0) | (np.asarray(sina, dtype=FLOAT) < 0), 0.0, Wel)
+
+
+def calc_physics(diff, dwn, alb, sina, delta, w, beta, y, T, Ff, KPD, LENGHT, WIDTH, lantitude=LANTITUDE,
+                 intermediates=True):
+    # Все аргументы - массивы или скаляры numpy, любые совместимые по broadcasting формы
+    if not intermediates:
+        # Только Wel: массивы этапов освобождаются сразу, для флота панелей это основная память
+        Hgt = transpose(diff, dwn, alb, sina, delta, w, beta, y, lantitude)['Hgt']
+        W = thermal(Hgt, T, Ff)['W']
+        return {'Wel': electrical(W, sina, KPD, LENGHT, WIDTH)}
+
+    result = transpose(diff, dwn, alb, sina, delta, w, beta, y, lantitude)
+    result.update(thermal(result['Hgt'], T, Ff))
+    result['Wel'] = electrical(result['W'], sina, KPD, LENGHT, WIDTH)
+    return result
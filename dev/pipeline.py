@@ -0,0 +1,185 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from calc import add_radiation, build_features, prepare_forecast, site_lantitude
+from forecast_cache import get_forecast
+from instrument import stage
+from parser import URL
+from physics import FIXED, electrical, panel_position, thermal, transpose
+from registry import get_model
+from schema import FLOAT
+
+# Сколько вариантов хранит каждый этап: прогнозов мало, положений панели - несколько десятков
+CACHE_SIZE = 32
+
+
+class LRUCache:
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        # Расчет вне блокировки: одинаковый ключ в двух потоках в худшем случае посчитается дважды
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+def frame_key(df):
+    # Ключ по содержимому: обновленный в кэше прогноз дает новый ключ
+    return int(pd.util.hash_pandas_object(df, index=False).sum()), df.shape
+
+
+def site_key(site):
+    return None if site is None else tuple(sorted(site.items()))
+
+
+class Pipeline:
+    # Этапы: прогноз -> геометрия -> радиация (модель) -> радиация на панели -> нагрев -> выработка.
+    # КПД и размеры влияют только на последний этап, beta/y - начиная с радиации на панели
+    STAGES = ('geometry', 'radiation', 'transposed', 'thermal', 'electrical')
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.caches = {name: LRUCache(maxsize) for name in self.STAGES}
+        self._last_frame = (None, None)
+        # Конвейер общий для потоков Worker, прогрева и сервиса
+        self._lock = threading.Lock()
+
+    def _frame_key(self, df):
+        # Хэш содержимого занимает несколько мс, поэтому для того же объекта (повторный расчет
+        # в GUI) берется прошлый ключ; переданный прогноз не должен изменяться на месте
+        with self._lock:
+            last_df, last_key = self._last_frame
+        if df is last_df:
+            return last_key
+        key = frame_key(df)
+        with self._lock:
+            self._last_frame = (df, key)
+        return key
+
+    def forecast(self, url=URL, backend=None):
+        # Прогноз уже кэшируется с TTL в forecast_cache
+        return get_forecast(url=url, backend=backend)
+
+    def geometry(self, df, site=None):
+        key = (self._frame_key(df), site_key(site))
+        return key, self.caches['geometry'].get(key, lambda: prepare_forecast(df, site))
+
+    def radiation(self, df, site=None):
+        geometry_key, geometry = self.geometry(df, site)
+        model = get_model()
+
+        def compute():
+            X = build_features(geometry)
+            with stage('predict'):
+                rf_pred = model.predict(X)
+            # Ссылка на модель хранится вместе с результатом, чтобы id(model) не переиспользовался
+            return model, add_radiation(geometry, rf_pred)
+
+        key = (geometry_key, id(model))
+        return key, self.caches['radiation'].get(key, compute)[1]
+
+    def transposed(self, df, optim, beta=None, y=None, site=None, tracking=FIXED, stow_wind=None):
+        radiation_key, radiation = self.radiation(df, site)
+        position = ('optim',) if optim else (float(beta), float(y))
+        position += (tracking, None if stow_wind is None else float(stow_wind))
+
+        def compute():
+            if optim:
+                beta_values = radiation['beta'].to_numpy(dtype=FLOAT)
+                y_values = radiation['y'].to_numpy(dtype=FLOAT)
+            else:
+                beta_values = np.full(len(radiation), beta, dtype=FLOAT)
+                y_values = np.full(len(radiation), y, dtype=FLOAT)
+            with stage('transposed'):
+                # Фактическое положение панели по часам хранится вместе с радиацией на нее
+                beta_values, y_values = panel_position(
+                    beta_values, y_values,
+                    radiation['delta'].to_numpy(dtype=FLOAT), radiation['w'].to_numpy(dtype=FLOAT),
+                    radiation['Ff'].to_numpy(dtype=FLOAT), tracking, stow_wind, site_lantitude(site)
+                )
+                result = transpose(
+                    diff=radiation['ALLSKY_SFC_SW_DIFF'].to_numpy(dtype=FLOAT),
+                    dwn=radiation['ALLSKY_SFC_SW_DWN'].to_numpy(dtype=FLOAT),
+                    alb=radiation['ALB'].to_numpy(dtype=FLOAT),
+                    sina=radiation['sina'].to_numpy(dtype=FLOAT),
+                    delta=radiation['delta'].to_numpy(dtype=FLOAT),
+                    w=radiation['w'].to_numpy(dtype=FLOAT),
+                    beta=beta_values,
+                    y=y_values,
+                    lantitude=site_lantitude(site),
+                )
+                result['beta'] = beta_values
+                result['y'] = y_values
+                return result
+
+        key = (radiation_key, position)
+        return key, radiation, self.caches['transposed'].get(key, compute)
+
+    def thermal(self, df, optim, beta=None, y=None, site=None, tracking=FIXED, stow_wind=None):
+        transposed_key, radiation, transposed = self.transposed(df, optim, beta, y, site, tracking, stow_wind)
+
+        def compute():
+            with stage('thermal'):
+                return thermal(
+                    transposed['Hgt'],
+                    T=radiation['T'].to_numpy(dtype=FLOAT),
+                    Ff=radiation['Ff'].to_numpy(dtype=FLOAT),
+                )
+
+        return transposed_key, radiation, transposed, self.caches['thermal'].get(transposed_key, compute)
+
+    def calc_power(self, df, KPD, LENGHT, WIDTH, optim, beta=None, y=None, site=None, tracking=FIXED,
+                   stow_wind=None):
+        # Тот же результат, что calc.calc_power, но пересчитываются только этапы с изменившимися входами
+        thermal_key, radiation, transposed, heat = self.thermal(df, optim, beta, y, site, tracking, stow_wind)
+
+        def compute():
+            with stage('electrical'):
+                return electrical(heat['W'], radiation['sina'].to_numpy(dtype=FLOAT), KPD, LENGHT, WIDTH)
+
+        key = (thermal_key, float(KPD), float(LENGHT), float(WIDTH))
+        Wel = self.caches['electrical'].get(key, compute)
+
+        # Таблица собирается одним конструктором: по одной колонке заметно дольше
+        columns = {column: radiation[column] for column in radiation.columns}
+        columns.update(transposed)
+        columns.update(heat)
+        columns['Wel'] = Wel
+        return pd.DataFrame(columns, index=radiation.index)
+
+    def stats(self):
+        return {name: {'hits': cache.hits, 'misses': cache.misses, 'size': len(cache)}
+                for name, cache in self.caches.items()}
+
+    def clear(self):
+        for cache in self.caches.values():
+            cache.clear()
+
+
+pipeline = Pipeline()
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+
+import joblib
+
+from forest import FlatForest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(script_dir, 'model.pkl')
+
+# mmap_mode='r' позволяет нескольким процессам читать массивы модели из одного файла на диске
+MMAP_MODE = os.environ.get('SOLAR_MODEL_MMAP') or None
+
+# 'sklearn' - исходный estimator, 'flat' - плоские массивы узлов (forest.FlatForest)
+BACKEND = os.environ.get('SOLAR_MODEL_BACKEND', 'sklearn')
+BACKENDS = ('sklearn', 'flat')
+
+_models = {}
+_lock = threading.Lock()
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def flat_path(path):
+    return os.path.splitext(path)[0] + '.flat.pkl'
+
+
+def flat_hash_path(path):
+    # Хэш исходной модели хранится рядом с плоской: устаревший кэш отбрасывается без чтения ~100 МБ
+    return flat_path(path) + '.sha256'
+
+
+def _read_hash(path):
+    try:
+        with open(path, encoding='ascii') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _load_flat(path, digest, mmap_mode):
+    cache = flat_path(path)
+    hash_path = flat_hash_path(path)
+    if os.path.exists(cache) and _read_hash(hash_path) == digest:
+        try:
+            return joblib.load(cache, mmap_mode=mmap_mode)
+        except Exception:
+            # Испорченный кэш пересобирается; оборванный pickle падает с любой ошибкой
+            pass
+
+    flat = FlatForest.from_estimator(joblib.load(path))
+    try:
+        # Сначала убирается старый хэш: при сбое между записями кэш считается устаревшим
+        if os.path.exists(hash_path):
+            os.remove(hash_path)
+        # Временные файлы свои у каждого процесса и потока: кэш могут строить одновременно
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        joblib.dump(flat, cache + suffix)
+        os.replace(cache + suffix, cache)
+        with open(hash_path + suffix, 'w', encoding='ascii') as f:
+            f.write(digest)
+        os.replace(hash_path + suffix, hash_path)
+    except OSError:
+        return flat
+    # Перечитываем с диска, чтобы массивы были отображены в память так же, как при следующих запусках
+    return joblib.load(cache, mmap_mode=mmap_mode)
+
+
+def set_defaults(backend=None, mmap_mode=None):
+    # Модель по умолчанию для get_model() без аргументов, например в процессах-воркерах бэктеста
+    global BACKEND, MMAP_MODE
+    if backend is not None:
+        BACKEND = backend
+    MMAP_MODE = mmap_mode
+
+
+def get_model(path=MODEL_PATH, mmap_mode=None, backend=None):
+    backend = backend or BACKEND
+    mmap_mode = mmap_mode or MMAP_MODE
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный backend модели: {backend}")
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = (path, mmap_mode, backend)
+
+    with _lock:
+        entry = _models.get(key)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry['model']
+
+        digest = file_hash(path)
+        if entry is not None and entry['hash'] == digest:
+            entry['stamp'] = stamp
+            return entry['model']
+
+        if backend == 'flat':
+            model = _load_flat(path, digest, mmap_mode)
+        else:
+            model = joblib.load(path, mmap_mode=mmap_mode)
+        _models[key] = {'stamp': stamp, 'hash': digest, 'model': model}
+        return model
+
+
+def clear_models():
+    with _lock:
+        _models.clear()
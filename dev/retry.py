@@ -0,0 +1,141 @@
+import os
+import random
+import threading
+import time
+import urllib.error
+
+
+class TransientError(Exception):
+    # Временная ошибка (сеть, сайт, браузер): имеет смысл повторить
+    pass
+
+
+class Cancelled(Exception):
+    pass
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=5, base_delay=2.0, max_delay=60.0, jitter=0.5, timeout=90.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+
+DEFAULT_POLICY = RetryPolicy(
+    max_attempts=int(os.environ.get('SOLAR_RETRY_ATTEMPTS', 5)),
+    timeout=float(os.environ.get('SOLAR_RETRY_TIMEOUT', 90)),
+)
+
+
+def is_transient(error):
+    if isinstance(error, (TransientError, TimeoutError, ConnectionError, urllib.error.URLError)):
+        return True
+    # Ошибки selenium проверяем по модулю, чтобы не импортировать его без необходимости
+    return any(cls.__module__.startswith('selenium') for cls in type(error).__mro__)
+
+
+class Attempt:
+    # Попытка, выполняемая в отдельном потоке. Если ее бросили (таймаут или отмена),
+    # вызываются зарегистрированные в ней функции: например, пул браузеров забирает сессию,
+    # которую держит зависший поток
+    def __init__(self):
+        self.abandoned = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_abandon(self, callback):
+        with self._lock:
+            if not self.abandoned.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def abandon(self):
+        with self._lock:
+            self.abandoned.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+_local = threading.local()
+
+
+def current_attempt():
+    return getattr(_local, 'attempt', None)
+
+
+def on_abandon(callback):
+    # Вне call_with_timeout ничего не делает: попытку некому бросить
+    attempt = current_attempt()
+    if attempt is not None:
+        attempt.on_abandon(callback)
+
+
+# Как часто ожидающий попытку поток проверяет отмену, с
+CANCEL_POLL = 0.1
+
+
+def call_with_timeout(fn, timeout, cancel_event=None):
+    if timeout is None and cancel_event is None:
+        return fn()
+
+    result = {}
+    attempt = Attempt()
+
+    def target():
+        _local.attempt = attempt
+        try:
+            result['value'] = fn()
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        thread.join(CANCEL_POLL if remaining is None else min(CANCEL_POLL, remaining))
+        if not thread.is_alive():
+            break
+        if cancel_event is not None and cancel_event.is_set():
+            attempt.abandon()
+            raise Cancelled()
+    if thread.is_alive():
+        # Поток нельзя прервать принудительно: оставляем его завершаться в фоне,
+        # а занятые им ресурсы освобождаются через on_abandon
+        attempt.abandon()
+        raise TimeoutError(f"Превышено время ожидания ({timeout:g} с)")
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+def run_with_retry(fn, policy=DEFAULT_POLICY, cancel_event=None, on_retry=None):
+    cancel_event = cancel_event or threading.Event()
+    for attempt in range(1, policy.max_attempts + 1):
+        if cancel_event.is_set():
+            raise Cancelled()
+        try:
+            return call_with_timeout(fn, policy.timeout, cancel_event)
+        except Cancelled:
+            raise
+        except Exception as e:
+            if not is_transient(e) or attempt == policy.max_attempts:
+                raise
+            delay = policy.delay(attempt)
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            if cancel_event.wait(delay):
+                raise Cancelled()
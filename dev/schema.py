@@ -0,0 +1,94 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Компактная раскладка таблиц прогноза и расчета: измерения и расчетные величины во float32,
+# время - в малых целых. Деревья модели все равно сравнивают признаки во float32, поэтому
+# предсказания не меняются. SOLAR_COMPACT=0 - прежние float64/int64
+COMPACT = os.environ.get('SOLAR_COMPACT', '1') != '0'
+FLOAT = np.float32 if COMPACT else np.float64
+
+TIME = ['YEAR', 'MO', 'DY', 'HR']
+MEASUREMENTS = ['T', 'Po', 'U', 'Ff', 'N', 'W1', 'Nh']
+GEOMETRY = ['SZA', 'ALB', 'delta', 'sina', 'beta', 'y', 'w']
+RADIATION = ['ALLSKY_SFC_SW_DIFF', 'ALLSKY_SFC_SW_DWN']
+# Промежуточные величины физики: нужны для таблицы в GUI, но не для итоговой выработки
+INTERMEDIATES = ['rad_pram', 'cos', 'Hnorm', 'Hbt', 'Hdt', 'Hrt', 'Hgt', 'Tmod', 'Tyach', 'W']
+PHYSICS = INTERMEDIATES + ['Wel']
+
+if COMPACT:
+    INT_TYPES = {'YEAR': np.int16, 'MO': np.int8, 'DY': np.int8, 'HR': np.int8, 'NDAY': np.int16}
+else:
+    INT_TYPES = {column: np.int64 for column in TIME + ['NDAY']}
+
+TYPES = dict(INT_TYPES)
+TYPES.update({column: FLOAT for column in MEASUREMENTS + GEOMETRY + RADIATION + PHYSICS})
+
+
+def to_numeric(series):
+    # Числа из строк rp5 и архива: запятая как десятичный разделитель, нечисловое - NaN
+    if not pd.api.types.is_numeric_dtype(series):
+        try:
+            # Обычный случай - все строки уже числа с точкой: разбор без pandas в разы быстрее
+            return pd.Series(series.to_numpy(dtype=float), index=series.index, name=series.name)
+        except (TypeError, ValueError):
+            series = series.astype(str).str.replace(',', '.')
+    return pd.to_numeric(series, errors='coerce')
+
+
+def cast(series, dtype):
+    if series.dtype == dtype:
+        return series
+    if not pd.api.types.is_numeric_dtype(series):
+        series = to_numeric(series)
+    # Пропуск в целой колонке (нераспознанный час) не должен ронять расчет
+    if np.issubdtype(dtype, np.integer) and series.isna().any():
+        dtype = FLOAT
+    return series.astype(dtype)
+
+
+def apply_schema(df, types=None):
+    # Приведение на месте: меняются только колонки, тип которых отличается от схемы
+    for column, dtype in (types or TYPES).items():
+        if column in df.columns:
+            series = df[column]
+            converted = cast(series, dtype)
+            if converted is not series:
+                df[column] = converted
+    return df
+
+
+def drop_intermediates(df):
+    df.drop(columns=[column for column in INTERMEDIATES if column in df.columns], inplace=True)
+    return df
+
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def peak_rss_mb():
+    # Пик резидентной памяти процесса; на Windows модуля resource нет.
+    # ru_maxrss в Linux - в килобайтах, в macOS - в байтах
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def memory_report(df):
+    rows = [(column, str(df[column].dtype), df[column].memory_usage(deep=True, index=False) / 2 ** 20)
+            for column in df.columns]
+    lines = [f"{column:24s} {dtype:10s} {mb:8.2f} МБ" for column, dtype, mb in rows]
+    lines.append(f"{'итого':24s} {'':10s} {frame_mb(df):8.2f} МБ, строк {len(df)}")
+    peak = peak_rss_mb()
+    if peak is not None:
+        lines.append(f"пик RSS процесса {peak:.1f} МБ")
+    return '\n'.join(lines)
@@ -0,0 +1,315 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+
+import numpy as np
+
+from calc import apply_physics
+from forecast_cache import get_forecast
+from multisite import GEOMETRY_KEYS, fetch_forecasts, predict_sites, site_params
+from parser import URL
+from physics import FIXED, TRACKING_MODES
+from registry import get_model
+from sinks import make_sink
+from tables import load_tables
+
+WINDOW_MS = 20
+MAX_BATCH = 64
+RESULT_COLUMNS = ['YEAR', 'MO', 'DY', 'HR', 'Wel']
+
+
+def panel_from_request(data):
+    # Те же поля, что SolarPanelForm.get_panel_parameters; КПД в процентах
+    tilt, azimuth = data.get('tilt'), data.get('azimuth')
+    default_position = bool(data.get('default_position', tilt is None))
+    if not data.get('default_position') and (tilt is None) != (azimuth is None):
+        raise ValueError("наклон и азимут задаются вместе; без обоих - оптимальное положение")
+    tracking = data.get('tracking') or FIXED
+    if tracking not in TRACKING_MODES:
+        raise ValueError(f"неизвестный режим слежения: {tracking}")
+    return {
+        'efficiency': float(data['efficiency']),
+        'length': float(data['length']),
+        'width': float(data['width']),
+        'default_position': default_position,
+        'azimuth': None if default_position else float(azimuth),
+        'tilt': None if default_position else float(tilt),
+        'tracking': tracking,
+        'stow_wind': None if data.get('stow_wind') is None else float(data['stow_wind']),
+    }
+
+
+def site_from_request(site):
+    # Площадка запроса: словарь только с числовыми параметрами геометрии (multisite.GEOMETRY_KEYS)
+    if site is None:
+        return {}
+    if not isinstance(site, dict):
+        raise ValueError("site должен быть объектом с параметрами площадки")
+    unknown = set(site) - set(GEOMETRY_KEYS)
+    if unknown:
+        raise ValueError(f"неизвестные параметры площадки: {', '.join(sorted(map(str, unknown)))}")
+    result = {}
+    for key, value in site.items():
+        if key == 'noon_hour' and value is None:
+            result[key] = None
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and np.isfinite(value):
+            result[key] = float(value)
+        else:
+            raise ValueError(f"параметр площадки {key} должен быть числом")
+    return result
+
+
+class ServiceStats:
+    def __init__(self, size=10000):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record_batch(self):
+        with self._lock:
+            self.batches += 1
+
+    def record(self, latency, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            uptime = time.time() - self.started
+            result = {
+                'requests': self.requests,
+                'errors': self.errors,
+                'batches': self.batches,
+                'uptime_s': round(uptime, 3),
+                'throughput_rps': round(self.requests / uptime, 3) if uptime else 0.0,
+                'mean_batch': round(self.requests / self.batches, 3) if self.batches else 0.0,
+            }
+        for q in (50, 95, 99):
+            result[f'latency_p{q}_ms'] = round(float(np.percentile(latencies, q)), 3) if latencies.size else None
+        return result
+
+
+class MicroBatcher:
+    # Запросы, пришедшие в пределах окна, считаются одной матрицей признаков и одним вызовом predict
+    def __init__(self, window_ms=WINDOW_MS, max_batch=MAX_BATCH, stats=None, fetch=None):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.stats = stats or ServiceStats()
+        self.fetch = fetch or (lambda url, backend: get_forecast(url=url, backend=backend))
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, panel, url=URL, backend=None, site=None):
+        future = Future()
+        self._queue.put({'panel': panel, 'url': url, 'backend': backend,
+                         'site': site or {}, 'future': future, 'started': time.perf_counter()})
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.stats.record_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                for item in batch:
+                    if not item['future'].done():
+                        item['future'].set_exception(e)
+            for item in batch:
+                self.stats.record(time.perf_counter() - item['started'], item['future'].exception() is None)
+
+    def _process(self, batch):
+        # Разные адреса загружаются параллельно: медленная страница rp5 не задерживает остальные
+        keys = list(dict.fromkeys((item['url'], item['backend']) for item in batch))
+        forecasts, errors = fetch_forecasts(
+            [{'name': key, 'url': key[0], 'backend': key[1]} for key in keys],
+            fetch=lambda site: self.fetch(site['url'], site['backend'])
+        )
+
+        # Ошибка одного запроса (площадка, прогноз) завершает только его future, а не весь пакет
+        sites = []
+        for i, item in enumerate(batch):
+            key = (item['url'], item['backend'])
+            if key in errors:
+                item['future'].set_exception(errors[key])
+                continue
+            try:
+                sites.append(dict(site_from_request(item['site']), name=i))
+            except Exception as e:
+                item['future'].set_exception(e)
+
+        site_errors = {}
+        radiation = predict_sites(
+            {site['name']: forecasts[(batch[site['name']]['url'], batch[site['name']]['backend'])] for site in sites},
+            sites, errors=site_errors
+        )
+        for name, error in site_errors.items():
+            batch[name]['future'].set_exception(error)
+        sites = [site for site in sites if site['name'] in radiation]
+
+        for site in sites:
+            item = batch[site['name']]
+            panel = item['panel']
+            try:
+                power_df = apply_physics(
+                    radiation[site['name']],
+                    KPD=panel['efficiency'] / 100,
+                    LENGHT=panel['length'],
+                    WIDTH=panel['width'],
+                    optim=panel['default_position'],
+                    beta=panel['tilt'],
+                    y=panel['azimuth'],
+                    site=site_params(site) or None,
+                    intermediates=False,
+                    tracking=panel['tracking'],
+                    stow_wind=panel['stow_wind'],
+                )
+                item['future'].set_result(power_df)
+            except Exception as e:
+                item['future'].set_exception(e)
+
+
+def to_records(power_df):
+    df = power_df[RESULT_COLUMNS].astype(float)
+    return json.loads(df.to_json(orient='records'))
+
+
+def make_handler(batcher, url, backend):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, batcher.stats.snapshot())
+            elif self.path == '/health':
+                self._send(200, {'status': 'ok'})
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/calc':
+                self._send(404, {'error': 'not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                data = json.loads(self.rfile.read(length) or b'{}')
+                panel = panel_from_request(data)
+                site = site_from_request(data.get('site'))
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {'error': f'bad request: {e}'})
+                return
+            future = batcher.submit(panel, url=data.get('url', url), backend=data.get('backend', backend),
+                                    site=site)
+            try:
+                self._send(200, {'result': to_records(future.result())})
+            except Exception as e:
+                self._send(500, {'error': str(e)})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def warm_up():
+    load_tables()
+    get_model()
+
+
+def serve(host='127.0.0.1', port=8080, url=URL, backend=None, window_ms=WINDOW_MS, max_batch=MAX_BATCH):
+    warm_up()
+    batcher = MicroBatcher(window_ms=window_ms, max_batch=max_batch)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher, url, backend))
+    server.batcher = batcher
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Расчет выработки солнечной панели без графического интерфейса")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    calc_parser = commands.add_parser('calc', help="однократный расчет")
+    calc_parser.add_argument('--efficiency', type=float, required=True, help="КПД, %%")
+    calc_parser.add_argument('--length', type=float, required=True, help="длина, м")
+    calc_parser.add_argument('--width', type=float, required=True, help="ширина, м")
+    calc_parser.add_argument('--tilt', type=float, help="наклон, °; без наклона и азимута - оптимальное положение")
+    calc_parser.add_argument('--azimuth', type=float, help="азимут, °")
+    calc_parser.add_argument('--tracking', choices=TRACKING_MODES, default=FIXED,
+                             help="следящая система: fixed - нет, single - одноосная, dual - двухосная")
+    calc_parser.add_argument('--stow-wind', type=float, help="скорость ветра, м/с, выше которой панель уходит в горизонт")
+    calc_parser.add_argument('--output', help="файл .csv/.parquet/.arrow; по умолчанию CSV в stdout")
+
+    serve_parser = commands.add_parser('serve', help="HTTP/JSON сервер")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--window-ms', type=float, default=WINDOW_MS)
+    serve_parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+
+    for sub in (calc_parser, serve_parser):
+        sub.add_argument('--url', default=URL, help="страница прогноза rp5")
+        sub.add_argument('--backend', choices=['selenium', 'http'], help="способ загрузки погоды")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'calc':
+        try:
+            panel = panel_from_request(vars(args))
+        except ValueError as e:
+            calc_parser.error(str(e))
+        batcher = MicroBatcher(window_ms=0)
+        power_df = batcher.submit(panel, url=args.url, backend=args.backend).result()
+        if args.output:
+            sink = make_sink(args.output, columns=RESULT_COLUMNS, encoding='utf-8-sig')
+            try:
+                sink.write(power_df)
+            finally:
+                sink.close()
+        else:
+            power_df[RESULT_COLUMNS].to_csv(sys.stdout, index=False)
+        return 0
+
+    server = serve(args.host, args.port, args.url, args.backend, args.window_ms, args.max_batch)
+    print(f"http://{args.host}:{server.server_address[1]}/calc", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import queue
+import threading
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Для записи в Parquet/Arrow требуется пакет pyarrow") from e
+    return pyarrow
+
+
+class CsvSink:
+    def __init__(self, path, columns=None, encoding='utf-8'):
+        self.path = path
+        self.columns = columns
+        self.encoding = encoding
+        self._header = True
+
+    def write(self, df):
+        if self.columns is not None:
+            df = df[self.columns]
+        # BOM (utf-8-sig) пишется только в начало файла
+        encoding = self.encoding if self._header else self.encoding.replace('-sig', '')
+        df.to_csv(self.path, mode='w' if self._header else 'a', header=self._header,
+                  index=False, encoding=encoding)
+        self._header = False
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    def __init__(self, path, columns=None, compression='zstd'):
+        self.path = path
+        self.columns = columns
+        self.compression = compression
+        self._writer = None
+
+    def write(self, df):
+        pa = _import_pyarrow()
+        import pyarrow.parquet as pq
+
+        if self.columns is not None:
+            df = df[self.columns]
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression=self.compression)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ArrowSink:
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = columns
+        self._file = None
+        self._writer = None
+
+    def write(self, df):
+        pa = _import_pyarrow()
+
+        if self.columns is not None:
+            df = df[self.columns]
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._file = pa.OSFile(self.path, 'wb')
+            self._writer = pa.ipc.new_file(self._file, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._file.close()
+            self._writer = None
+            self._file = None
+
+
+class BackgroundSink:
+    # Запись выполняется в отдельном потоке, write() не ждет диска
+    def __init__(self, sink, max_queue=16):
+        self.sink = sink
+        self.error = None
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            df = self._queue.get()
+            if df is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.sink.write(df)
+            except Exception as e:
+                self.error = e
+
+    def write(self, df):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(df.copy())
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self.sink.close()
+        finally:
+            if self.error is not None:
+                raise self.error
+
+
+SINKS = {
+    '.csv': CsvSink,
+    '.parquet': ParquetSink,
+    '.arrow': ArrowSink,
+    '.feather': ArrowSink,
+}
+
+
+def make_sink(path, columns=None, background=False, encoding='utf-8'):
+    ext = os.path.splitext(path)[1].lower()
+    sink_class = SINKS.get(ext, CsvSink)
+    if sink_class is CsvSink:
+        sink = CsvSink(path, columns=columns, encoding=encoding)
+    else:
+        sink = sink_class(path, columns=columns)
+    if background:
+        sink = BackgroundSink(sink)
+    return sink
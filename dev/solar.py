@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from physics import LANTITUDE
+from tables import lookup_geometry
+
+LONGITUDE = 104.3
+TZ = 8
+
+# Параметры, с которыми рассчитаны data/params.csv и data/w.csv для Иркутска:
+# в w.csv часовой угол отсчитывается по часам от 11:00, а не по истинному солнечному времени
+IRKUTSK = {'lantitude': LANTITUDE, 'longitude': LONGITUDE, 'tz': TZ, 'noon_hour': 11}
+
+# Номер дня в невисокосном году; 29 февраля в params.csv получает номер 28 февраля
+NONLEAP_OFFSET = np.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334])
+
+# Сколько точек внутри часа усредняется для SZA
+SZA_STEPS = 4
+
+to_rad = np.pi / 180
+
+
+def day_number(MO, DY):
+    MO = np.asarray(MO)
+    DY = np.asarray(DY)
+    return NONLEAP_OFFSET[np.clip(MO, 1, 12) - 1] + np.where((MO == 2) & (DY == 29), 28, DY)
+
+
+def declination(n):
+    return 23.45 * np.sin(2 * np.pi * (284 + n) / 365)
+
+
+def equation_of_time(n):
+    # Минуты
+    B = 2 * np.pi * (n - 81) / 365
+    return 9.87 * np.sin(2 * B) - 7.53 * np.cos(B) - 1.5 * np.sin(B)
+
+
+def solar_hour_angle(n, HR, longitude, tz):
+    solar_time = HR + (longitude - 15 * tz) / 15 + equation_of_time(n) / 60
+    return 15 * (solar_time - 12)
+
+
+def _cos_zenith(sin_lan, cos_lan, sin_delta, cos_delta, w):
+    return np.clip(sin_lan * sin_delta + cos_lan * cos_delta * np.cos(w * to_rad), -1, 1)
+
+
+def sun_position(delta, w, lantitude):
+    # Зенитный угол и азимут от севера без знака (0..180), как beta/y в params.csv
+    sin_lan = np.sin(lantitude * to_rad)
+    cos_lan = np.cos(lantitude * to_rad)
+    sin_delta = np.sin(delta * to_rad)
+
+    cos_zenith = _cos_zenith(sin_lan, cos_lan, sin_delta, np.cos(delta * to_rad), w)
+    zenith = np.arccos(cos_zenith)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_azimuth = (sin_delta - sin_lan * cos_zenith) / (cos_lan * np.sin(zenith))
+    azimuth = np.arccos(np.clip(np.nan_to_num(cos_azimuth, nan=1.0), -1, 1))
+    return zenith / to_rad, azimuth / to_rad
+
+
+def mean_sza(n, HR, delta, lantitude, longitude, tz):
+    # SZA в params.csv взят из NASA POWER: среднее за час, ночью 90, время - UTC + round(lon / 15)
+    sin_lan = np.sin(lantitude * to_rad)
+    cos_lan = np.cos(lantitude * to_rad)
+    sin_delta = np.sin(delta * to_rad)
+    cos_delta = np.cos(delta * to_rad)
+
+    # Зенит ниже горизонта обрезается до 90, т.е. cos_zenith до 0
+    w = solar_hour_angle(n, HR + tz - np.round(longitude / 15), longitude, tz)
+    total = 0
+    for step in range(SZA_STEPS):
+        cos_zenith = _cos_zenith(sin_lan, cos_lan, sin_delta, cos_delta, w + 15 * (step + 0.5) / SZA_STEPS)
+        total = total + np.arccos(np.maximum(cos_zenith, 0))
+    return total / SZA_STEPS / to_rad
+
+
+def solar_geometry(MO, DY, HR, lantitude=LANTITUDE, longitude=LONGITUDE, tz=TZ, noon_hour=None):
+    # Массивы времени и параметры площадок совместимы по broadcasting:
+    # например MO[:, None] и lantitude[None, :] дают таблицу (время x площадка)
+    # noon_hour=None - часовой угол по истинному солнечному времени
+    MO = np.asarray(MO)
+    DY = np.asarray(DY)
+    HR = np.asarray(HR, dtype=float)
+    lantitude = np.asarray(lantitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    tz = np.asarray(tz, dtype=float)
+
+    n = day_number(MO, DY)
+    delta = declination(n)
+    solar_w = solar_hour_angle(n, HR, longitude, tz)
+    if noon_hour is None:
+        w = solar_w
+    else:
+        w = np.broadcast_to(15 * (HR - noon_hour), solar_w.shape)
+
+    sina = (np.sin(lantitude * to_rad) * np.sin(delta * to_rad)
+            + np.cos(lantitude * to_rad) * np.cos(delta * to_rad) * np.cos(w * to_rad))
+    beta, y = sun_position(delta, solar_w, lantitude)
+
+    return {
+        'SZA': mean_sza(n, HR, delta, lantitude, longitude, tz),
+        'NDAY': np.broadcast_to(n, sina.shape),
+        'delta': np.broadcast_to(delta, sina.shape),
+        'sina': sina,
+        'beta': beta,
+        'y': y,
+        'w': w,
+    }
+
+
+def site_geometry(MO, DY, HR, site):
+    # Замена lookup_geometry для произвольной площадки; альбедо берется из таблицы Иркутска
+    MO = pd.to_numeric(pd.Series(MO), errors='coerce').fillna(0).to_numpy(dtype=int)
+    DY = pd.to_numeric(pd.Series(DY), errors='coerce').fillna(0).to_numpy(dtype=int)
+    HR = pd.to_numeric(pd.Series(HR), errors='coerce').to_numpy(dtype=float)
+
+    geometry = solar_geometry(MO, DY, HR, **site)
+    albedo = lookup_geometry(MO, DY, HR)['ALB']
+    return {
+        'SZA': geometry['SZA'],
+        'ALB': albedo,
+        'NDAY': geometry['NDAY'],
+        'delta': geometry['delta'],
+        'sina': geometry['sina'],
+        'beta': geometry['beta'],
+        'y': geometry['y'],
+        'w': geometry['w'],
+    }
@@ -0,0 +1,122 @@
+import os
+import threading
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from schema import FLOAT
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+PARAMS_PATH = os.path.join(script_dir, 'data/params.csv')
+W_PATH = os.path.join(script_dir, 'data/w.csv')
+CACHE_PATH = os.path.join(script_dir, 'data/tables.npz')
+
+PARAMS_COLUMNS = ['SZA', 'ALB', 'NDAY', 'delta', 'sina', 'beta', 'y']
+INT_COLUMNS = ['NDAY', 'w']
+HOURS = 24
+DAYS = 366
+
+# Смещение первого дня месяца в високосном году: params.csv содержит 29 февраля
+MONTH_OFFSET = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+MONTH_DAYS = np.array([31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+_tables = {}
+_lock = threading.Lock()
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def day_index(MO, DY, YEAR=None):
+    # Несуществующая дата (30 февраля, 31 апреля) - -1, как пропуск при merge с params.csv;
+    # без YEAR 29 февраля допустимо всегда
+    MO = np.asarray(MO)
+    DY = np.asarray(DY)
+    month = np.clip(MO, 1, 12) - 1
+    days = MONTH_DAYS[month]
+    if YEAR is not None:
+        YEAR = np.asarray(YEAR)
+        leap = (YEAR % 4 == 0) & ((YEAR % 100 != 0) | (YEAR % 400 == 0))
+        days = np.where((month == 1) & ~leap, 28, days)
+    valid = (MO >= 1) & (MO <= 12) & (DY >= 1) & (DY <= days)
+    return np.where(valid, MONTH_OFFSET[month] + DY - 1, -1)
+
+
+def _build_tables():
+    params = pd.read_csv(PARAMS_PATH, delimiter=',', encoding='utf-8-sig', index_col=False)
+    w = pd.read_csv(W_PATH, delimiter=',', encoding='utf-8', index_col=False)
+
+    index = day_index(params['MO'].to_numpy(), params['DY'].to_numpy()) * HOURS + params['HR'].to_numpy()
+    tables = {}
+    for column in PARAMS_COLUMNS:
+        values = pd.to_numeric(params[column], errors='coerce').to_numpy(dtype=float)
+        table = np.full(DAYS * HOURS, np.nan)
+        table[index] = values
+        tables[column] = table
+    tables['filled'] = np.zeros(DAYS * HOURS, dtype=bool)
+    tables['filled'][index] = True
+
+    tables['w'] = np.full(HOURS, np.nan)
+    tables['w'][w['HR'].to_numpy()] = w['w'].to_numpy(dtype=float)
+    return tables
+
+
+def load_tables():
+    stamp = np.concatenate([_stamp(PARAMS_PATH), _stamp(W_PATH)])
+
+    with _lock:
+        if 'stamp' in _tables and np.array_equal(_tables['stamp'], stamp):
+            return _tables
+
+        tables = None
+        if os.path.exists(CACHE_PATH):
+            try:
+                with np.load(CACHE_PATH) as cache:
+                    if np.array_equal(cache['stamp'], stamp):
+                        tables = {name: cache[name] for name in cache.files}
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+                # Оборванный или испорченный кэш пересобирается из csv и перезаписывается
+                tables = None
+
+        if tables is None:
+            tables = _build_tables()
+            tables['stamp'] = stamp
+            try:
+                # Свое имя у каждого процесса и потока: воркеры бэктеста могут пересобирать кэш одновременно
+                tmp_path = f'{CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+                np.savez(tmp_path, **tables)
+                os.replace(tmp_path, CACHE_PATH)
+            except OSError:
+                pass
+
+        _tables.clear()
+        _tables.update(tables)
+        return _tables
+
+
+def lookup_geometry(MO, DY, HR, YEAR=None):
+    tables = load_tables()
+    MO = pd.to_numeric(pd.Series(MO), errors='coerce').fillna(0).to_numpy(dtype=int)
+    DY = pd.to_numeric(pd.Series(DY), errors='coerce').fillna(0).to_numpy(dtype=int)
+    HR = pd.to_numeric(pd.Series(HR), errors='coerce').fillna(-1).to_numpy(dtype=int)
+    if YEAR is not None:
+        YEAR = pd.to_numeric(pd.Series(YEAR), errors='coerce').fillna(0).to_numpy(dtype=int)
+
+    valid_hour = (HR >= 0) & (HR < HOURS)
+    days = day_index(MO, DY, YEAR)
+    index = np.where((days >= 0) & valid_hour, days * HOURS + HR, 0)
+    found = (days >= 0) & valid_hour & tables['filled'][index]
+
+    # Значения таблиц выбираются сразу в типе схемы, без промежуточных массивов float64
+    result = {}
+    for column in PARAMS_COLUMNS:
+        result[column] = np.where(found, tables[column].astype(FLOAT)[index], np.nan)
+    result['w'] = np.where(valid_hour, tables['w'].astype(FLOAT)[np.where(valid_hour, HR, 0)], np.nan)
+
+    for column in INT_COLUMNS:
+        if not np.isnan(result[column]).any():
+            result[column] = result[column].astype(np.int64)
+    return result
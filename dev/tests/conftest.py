@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули dev/ импортируются как в приложении: from calc import calc_power
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
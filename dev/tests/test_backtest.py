@@ -0,0 +1,13 @@
+import pytest
+
+from backtest import main
+
+PANEL = ['archive.csv', '--efficiency', '20', '--length', '1.6', '--width', '1']
+
+
+@pytest.mark.parametrize('position', [['--tilt', '30'], ['--azimuth', '10']])
+def test_tilt_and_azimuth_go_together(position, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(PANEL + position)
+    assert exit_info.value.code == 2
+    assert "--tilt и --azimuth" in capsys.readouterr().err
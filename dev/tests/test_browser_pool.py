@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+import browser_pool
+from browser_pool import BrowserPool
+from multisite import fetch_forecasts
+
+LOAD = 0.2
+
+
+class FakeDriver:
+    def execute_script(self, script, *args):
+        return 1
+
+    def quit(self):
+        pass
+
+
+def load_page(pool):
+    with pool.session(timeout=5):
+        time.sleep(LOAD)
+    return threading.get_ident()
+
+
+def test_concurrent_acquires_do_not_serialize():
+    pool = BrowserPool(size=4, memory_limit_mb=0, factory=FakeDriver)
+    threads = [threading.Thread(target=load_page, args=(pool,)) for _ in range(4)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - started < 2 * LOAD
+    assert pool.stats()['created'] == 4
+    pool.close()
+
+
+def test_single_session_pool_serializes():
+    pool = BrowserPool(size=1, memory_limit_mb=0, factory=FakeDriver)
+    threads = [threading.Thread(target=load_page, args=(pool,)) for _ in range(3)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - started >= 3 * LOAD
+    pool.close()
+
+
+@pytest.fixture
+def shared_pool(monkeypatch):
+    pool = BrowserPool(size=1, memory_limit_mb=0, factory=FakeDriver)
+    monkeypatch.setattr(browser_pool, '_pool', pool)
+    yield pool
+    pool.close()
+
+
+def test_fetch_forecasts_grows_pool_to_its_concurrency(shared_pool):
+    sites = [{'name': i, 'url': f'http://rp5.test/{i}', 'backend': 'selenium'} for i in range(4)]
+    started = time.perf_counter()
+    forecasts, errors = fetch_forecasts(sites, max_workers=8, fetch=lambda site: load_page(shared_pool))
+    assert not errors and len(forecasts) == 4
+    # Время - как у самой медленной площадки, а не сумма загрузок
+    assert time.perf_counter() - started < 2 * LOAD
+    assert shared_pool.stats()['size'] == 4
+
+
+def test_http_sites_leave_pool_alone(shared_pool):
+    sites = [{'name': i, 'url': f'http://rp5.test/{i}', 'backend': 'http'} for i in range(3)]
+    fetch_forecasts(sites, fetch=lambda site: None)
+    assert shared_pool.stats()['size'] == 1
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from forecast_cache import ForecastCache
+
+SITE = 'http://rp5.test/'
+
+
+def test_cold_miss_is_fetched_once():
+    cache = ForecastCache(cache_dir=None)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return pd.DataFrame({'T': [1.0]})
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(SITE, fetch))) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 5 and all(df['T'].tolist() == [1.0] for df in results)
+    assert cache.stats()['misses'] == 1 and cache.stats()['coalesced'] == 4
+
+
+def test_cold_miss_error_reaches_every_waiter():
+    cache = ForecastCache(cache_dir=None)
+
+    def fetch():
+        raise ConnectionError("rp5 недоступен")
+
+    with pytest.raises(ConnectionError):
+        cache.get(SITE, fetch)
+    # Неудачная загрузка не остается в ожидании: следующий запрос загружает заново
+    assert cache.get(SITE, lambda: pd.DataFrame({'T': [2.0]}))['T'].tolist() == [2.0]
+
+
+def test_refresh_failure_is_recorded(caplog):
+    cache = ForecastCache(ttl=0, stale_ttl=3600, cache_dir=None)
+    cache.get(SITE, lambda: pd.DataFrame({'T': [1.0]}))
+
+    def broken():
+        raise ConnectionError("rp5 недоступен")
+
+    with caplog.at_level('WARNING', logger='solar.forecast_cache'):
+        assert cache.get(SITE, broken)['T'].tolist() == [1.0]
+        deadline = time.time() + 5
+        while cache.stats()['refresh_errors'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+
+    status = cache.status(SITE)
+    assert status['failures'] == 1 and 'rp5 недоступен' in status['last_error']
+    assert cache.stats()['refresh_errors'] == 1
+    assert any('rp5 недоступен' in record.getMessage() for record in caplog.records)
+
+
+def test_invalidate_memory_only_cache():
+    cache = ForecastCache(cache_dir=None)
+    cache.get(SITE, lambda: pd.DataFrame({'T': [1.0]}))
+    cache.invalidate(SITE)
+    assert cache.fetched_at(SITE) is None
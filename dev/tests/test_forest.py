@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+import forest
+from forest import FlatForest
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6))
+    y = np.stack([X[:, 0] * 3 + X[:, 1] ** 2, np.sin(X[:, 2]) + X[:, 3]], axis=1)
+    # Пропуски и в обучении, и в предсказании: проверяется missing_go_to_left
+    X[rng.random(X.shape) < 0.1] = np.nan
+    model = MultiOutputRegressor(RandomForestRegressor(n_estimators=7, max_depth=8, random_state=0))
+    model.fit(X, y)
+
+    X_test = rng.normal(size=(300, 6))
+    X_test[rng.random(X_test.shape) < 0.15] = np.nan
+    return model, FlatForest.from_estimator(model), X_test
+
+
+def test_numpy_path_matches_sklearn(fitted, monkeypatch):
+    model, flat, X = fitted
+    monkeypatch.setattr(forest, 'numba', None)
+    assert np.array_equal(flat.predict(X, n_jobs=1), model.predict(X))
+    assert forest.check_parity(model, flat, X) == 0.0
+
+
+def test_numpy_path_chunks_and_threads(fitted, monkeypatch):
+    model, flat, X = fitted
+    monkeypatch.setattr(forest, 'numba', None)
+    monkeypatch.setattr(forest, 'CHUNK_SIZE', 64)
+    assert np.array_equal(flat.predict(X, n_jobs=3), model.predict(X))
+
+
+def test_numba_path_matches_sklearn(fitted):
+    if forest.numba is None:
+        pytest.skip("numba не установлена")
+    model, flat, X = fitted
+    assert np.array_equal(flat.predict(X), model.predict(X))
+
+
+def test_trees_match_estimators(fitted):
+    model, flat, X = fitted
+    trees = flat.predict_trees(X)
+    for target, estimator in enumerate(model.estimators_):
+        expected = np.stack([tree.predict(X.astype(np.float32)) for tree in estimator.estimators_])
+        assert np.array_equal(trees[target], expected)
@@ -0,0 +1,40 @@
+import urllib.error
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from fake_rp5 import FakeRp5, make_snapshot
+from parser import parse_weather
+
+START = datetime(2024, 6, 1)
+
+
+@pytest.mark.parametrize('step', [1, 3])
+def test_http_backend_matches_snapshot(step):
+    html = make_snapshot(days=3, step=step, start=START)
+    expected = parse_weather(html=html)
+
+    with FakeRp5({'*': html}) as fake:
+        df = parse_weather(url=fake.url, backend='http')
+        assert fake.requests == 1
+
+    pd.testing.assert_frame_equal(df, expected)
+    assert len(df) == 3 * 24 // step
+    assert df['HR'].tolist()[:2] == [0, step]
+
+
+def test_snapshot_is_reproducible():
+    assert make_snapshot(start=START, seed=1) == make_snapshot(start=START, seed=1)
+    assert make_snapshot(start=START, seed=1) != make_snapshot(start=START, seed=2)
+
+
+def test_page_without_table_is_rejected():
+    with pytest.raises(ValueError):
+        parse_weather(html="<html><body><p>Сервис недоступен</p></body></html>")
+
+
+def test_missing_page_is_http_error():
+    with FakeRp5({}) as fake:
+        with pytest.raises(urllib.error.HTTPError):
+            parse_weather(url=fake.url, backend='http')
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from physics import LANTITUDE, incidence, panel_position, tracking_angles
+
+to_rad = np.pi / 180
+
+
+@pytest.fixture(scope='module')
+def sun():
+    # Склонение и часовой угол по всему году и суткам; только часы с солнцем над горизонтом
+    rng = np.random.default_rng(0)
+    delta = rng.uniform(-23.45, 23.45, 3000)
+    w = rng.uniform(-180, 180, 3000)
+    cos_zenith = (np.sin(LANTITUDE * to_rad) * np.sin(delta * to_rad)
+                  + np.cos(LANTITUDE * to_rad) * np.cos(delta * to_rad) * np.cos(w * to_rad))
+    return delta, w, cos_zenith > 0.01, cos_zenith
+
+
+def test_dual_axis_faces_the_sun(sun):
+    delta, w, day, cos_zenith = sun
+    beta, y = tracking_angles('dual', delta, w)
+    cos = incidence(beta, y, delta, w)
+    np.testing.assert_allclose(cos[day], 1, atol=1e-5)
+
+
+def test_single_axis_matches_brute_force(sun):
+    delta, w, day, cos_zenith = sun
+    beta, y = tracking_angles('single', delta, w)
+    assert set(np.unique(y[day])) <= {-90, 90}
+    cos = incidence(beta, y, delta, w)
+
+    # Лучший наклон панели на горизонтальной оси север-юг перебором с шагом 0.05°
+    tilts = np.linspace(-90, 90, 3601)
+    best = incidence(tilts[None, :], 90, delta[day, None], w[day, None]).max(axis=1)
+    np.testing.assert_allclose(cos[day], best, atol=1e-5)
+    assert (beta[day] >= 0).all() and (beta[day] <= 90).all()
+
+
+@pytest.mark.parametrize('mode', ['single', 'dual'])
+def test_panel_is_flat_at_night(sun, mode):
+    delta, w, day, cos_zenith = sun
+    beta, y = tracking_angles(mode, delta, w)
+    night = cos_zenith < 0
+    assert night.any()
+    assert (beta[night] == 0).all() and (y[night] == 0).all()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        tracking_angles('polar', [0.0], [0.0])
+
+
+def test_wind_stow():
+    delta = np.zeros(4)
+    w = np.zeros(4)
+    Ff = np.array([5.0, 15.0, np.nan, 10.0])
+    beta, y = panel_position(np.full(4, 45.0), np.zeros(4), delta, w, Ff, stow_wind=10)
+    # Порог не включается; пропуск ветра панель не убирает
+    assert beta.tolist() == [45, 0, 45, 45]
+
+    beta, y = panel_position(None, None, delta, w, Ff, tracking='dual', stow_wind=10)
+    np.testing.assert_allclose(beta[[0, 2, 3]], LANTITUDE, atol=1e-4)
+    assert beta[1] == 0
+
+    beta, y = panel_position(30.0, 5.0, delta, w, Ff)
+    assert (beta, y) == (30.0, 5.0)
@@ -0,0 +1,36 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from bench import synthetic_forecast
+from calc import calc_power
+from pipeline import Pipeline
+from registry import MODEL_PATH
+
+pytestmark = pytest.mark.skipif(not os.path.exists(MODEL_PATH), reason="нет model.pkl")
+
+
+def test_matches_calc_power():
+    df = synthetic_forecast(48, step=3)
+    for optim, beta, y in ((True, None, None), (False, 45, 10)):
+        expected = calc_power(df, 0.2, 1.6, 1.0, optim, beta, y)
+        result = Pipeline().calc_power(df, 0.2, 1.6, 1.0, optim, beta, y)
+        assert np.array_equal(result['Wel'].to_numpy(), expected['Wel'].to_numpy())
+
+
+def test_concurrent_calls_share_caches():
+    # Прогрев и Worker в GUI, запросы сервиса: несколько потоков с разными прогнозами
+    pipeline = Pipeline(maxsize=2)
+    frames = [synthetic_forecast(48, step=3, seed=seed) for seed in range(3)]
+    expected = [calc_power(df, 0.2, 1.6, 1.0, False, 30, 0)['Wel'].to_numpy() for df in frames]
+
+    def run(i):
+        df = frames[i % 3]
+        return i % 3, pipeline.calc_power(df, 0.2, 1.6, 1.0, False, 30, 0)['Wel'].to_numpy()
+
+    with ThreadPoolExecutor(6) as pool:
+        for index, Wel in pool.map(run, range(30)):
+            assert np.array_equal(Wel, expected[index])
+    assert all(size <= 2 for size in (stats['size'] for stats in pipeline.stats().values()))
@@ -0,0 +1,75 @@
+import os
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+import registry
+from forest import FlatForest
+
+
+def _model_file(tmp_path):
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(100, 3))
+    model = MultiOutputRegressor(RandomForestRegressor(n_estimators=3, random_state=0))
+    model.fit(X, X[:, :2])
+    path = tmp_path / 'model.pkl'
+    joblib.dump(model, path)
+    return str(path), X
+
+
+def test_stale_flat_cache_is_not_unpickled(tmp_path):
+    path, X = _model_file(tmp_path)
+    # Хэш не совпадает: кэш пересобирается, а его содержимое не читается
+    with open(registry.flat_path(path), 'wb') as f:
+        f.write(b'not a pickle')
+    with open(registry.flat_hash_path(path), 'w') as f:
+        f.write('0' * 64)
+
+    registry.clear_models()
+    flat = registry.get_model(path, backend='flat')
+    assert isinstance(flat, FlatForest)
+    with open(registry.flat_hash_path(path)) as f:
+        assert f.read() == registry.file_hash(path)
+    assert np.array_equal(flat.predict(X), joblib.load(path).predict(X))
+
+
+def test_fresh_flat_cache_is_reused(tmp_path, monkeypatch):
+    path, X = _model_file(tmp_path)
+    registry.clear_models()
+    registry.get_model(path, backend='flat')
+    registry.clear_models()
+
+    def rebuild(model):
+        raise AssertionError("кэш не должен пересобираться")
+
+    monkeypatch.setattr(FlatForest, 'from_estimator', rebuild)
+    flat = registry.get_model(path, backend='flat', mmap_mode='r')
+    assert isinstance(flat.threshold, np.memmap)
+    registry.clear_models()
+
+
+def test_set_defaults_selects_shared_flat_model(tmp_path, monkeypatch):
+    path, X = _model_file(tmp_path)
+    monkeypatch.setattr(registry, 'BACKEND', registry.BACKEND)
+    monkeypatch.setattr(registry, 'MMAP_MODE', registry.MMAP_MODE)
+    registry.set_defaults(backend='flat', mmap_mode='r')
+    registry.clear_models()
+    flat = registry.get_model(path)
+    assert isinstance(flat, FlatForest) and isinstance(flat.threshold, np.memmap)
+    registry.clear_models()
+
+
+def test_corrupt_flat_cache_with_current_hash_is_rebuilt(tmp_path):
+    path, X = _model_file(tmp_path)
+    with open(registry.flat_path(path), 'wb') as f:
+        f.write(b'truncated')
+    with open(registry.flat_hash_path(path), 'w') as f:
+        f.write(registry.file_hash(path))
+
+    registry.clear_models()
+    flat = registry.get_model(path, backend='flat', mmap_mode='r')
+    assert np.array_equal(flat.predict(X), joblib.load(path).predict(X))
+    assert not [name for name in os.listdir(tmp_path) if '.tmp' in name]
+    registry.clear_models()
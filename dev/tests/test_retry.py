@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from browser_pool import BrowserPool
+from retry import Cancelled, RetryPolicy, TransientError, call_with_timeout, run_with_retry
+
+FAST = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01, jitter=0, timeout=0.2)
+
+
+def test_cancel_interrupts_running_attempt():
+    cancel = threading.Event()
+    release = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+
+    started = time.monotonic()
+    with pytest.raises(Cancelled):
+        run_with_retry(lambda: release.wait(10), RetryPolicy(timeout=30), cancel_event=cancel)
+    release.set()
+    assert time.monotonic() - started < 1
+
+
+def test_cancel_without_timeout():
+    cancel = threading.Event()
+    release = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    with pytest.raises(Cancelled):
+        call_with_timeout(lambda: release.wait(10), None, cancel)
+    release.set()
+
+
+def test_non_transient_error_is_not_retried():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ValueError("Таблица не найдена")
+
+    with pytest.raises(ValueError):
+        run_with_retry(fn, FAST)
+    assert len(calls) == 1
+
+
+def test_transient_error_is_retried():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TransientError("сеть")
+        return 'ok'
+
+    assert run_with_retry(fn, FAST) == 'ok'
+    assert len(calls) == 3
+
+
+class FakeDriver:
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def quit(self):
+        self.closed.set()
+
+
+def test_timed_out_attempt_gives_back_browser():
+    drivers = []
+
+    def factory():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    pool = BrowserPool(size=1, memory_limit_mb=0, factory=factory)
+
+    def attempt():
+        with pool.session() as session:
+            if len(drivers) == 1:
+                # Первая попытка зависает, пока ее Chrome не закроют
+                session.driver.closed.wait(10)
+                raise ConnectionError("браузер закрыт")
+            return len(drivers)
+
+    started = time.monotonic()
+    assert run_with_retry(attempt, FAST) == 2
+    assert time.monotonic() - started < 2
+    assert drivers[0].closed.wait(1)
+    stats = pool.stats()
+    assert stats['open'] == 1 and stats['idle'] == 1 and stats['recycled'] == 1
+    pool.close()
@@ -0,0 +1,17 @@
+import pytest
+
+import schema
+
+resource = pytest.importorskip('resource')
+
+
+class Usage:
+    ru_maxrss = 300 * 2 ** 20
+
+
+def test_peak_rss_units(monkeypatch):
+    monkeypatch.setattr(resource, 'getrusage', lambda who: Usage)
+    monkeypatch.setattr(schema.sys, 'platform', 'darwin')
+    assert schema.peak_rss_mb() == 300
+    monkeypatch.setattr(schema.sys, 'platform', 'linux')
+    assert schema.peak_rss_mb() == 300 * 1024
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import pytest
+
+import forecast_cache
+from bench import synthetic_forecast
+from fake_rp5 import FakeRp5, make_snapshot
+from registry import MODEL_PATH
+from service import MicroBatcher, ServiceStats, main, panel_from_request, serve, site_from_request
+
+needs_model = pytest.mark.skipif(not os.path.exists(MODEL_PATH), reason="нет model.pkl")
+
+PANEL = {'efficiency': 20, 'length': 1.6, 'width': 1.0}
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_unknown_tracking_mode_is_rejected():
+    with pytest.raises(ValueError):
+        panel_from_request(dict(PANEL, tracking='polar'))
+    assert panel_from_request(dict(PANEL, tracking='dual'))['tracking'] == 'dual'
+
+
+def test_tilt_and_azimuth_go_together():
+    for data in (dict(PANEL, tilt=30), dict(PANEL, azimuth=10)):
+        with pytest.raises(ValueError, match="вместе"):
+            panel_from_request(data)
+    panel = panel_from_request(dict(PANEL, tilt=30, azimuth=10))
+    assert (panel['tilt'], panel['azimuth'], panel['default_position']) == (30.0, 10.0, False)
+    assert panel_from_request(dict(PANEL, default_position=True, tilt=30))['tilt'] is None
+
+
+def test_cli_tilt_without_azimuth_is_usage_error(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(['calc', '--efficiency', '20', '--length', '1', '--width', '1', '--tilt', '30'])
+    assert exit_info.value.code == 2
+    assert "вместе" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('site', [['x'], 'x', {'lantitude': 'abc'}, {'lantitude': True}, {'altitude': 1}])
+def test_invalid_site_is_rejected(site):
+    with pytest.raises(ValueError):
+        site_from_request(site)
+
+
+def test_valid_site():
+    assert site_from_request(None) == {}
+    assert site_from_request({'lantitude': 55, 'longitude': 37.6, 'tz': 3, 'noon_hour': None}) == \
+        {'lantitude': 55.0, 'longitude': 37.6, 'tz': 3.0, 'noon_hour': None}
+
+
+def test_batches_are_counted_under_lock():
+    stats = ServiceStats()
+    threads = [threading.Thread(target=lambda: [stats.record_batch() for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.snapshot()['batches'] == 4000
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(forecast_cache.forecast_cache, 'cache_dir', None)
+    html = make_snapshot(days=2, step=3, start=datetime(2024, 6, 1))
+    with FakeRp5({'*': html}) as fake:
+        server = serve(port=0, url=fake.url, backend='http', window_ms=5)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_address[1]}", fake
+        finally:
+            server.shutdown()
+            server.server_close()
+            forecast_cache.forecast_cache.invalidate(fake.url)
+
+
+@needs_model
+def test_calc_end_to_end(service):
+    url, fake = service
+    code, body = post(url + '/calc', dict(PANEL, tilt=45, azimuth=0))
+    assert code == 200
+    assert len(body['result']) == 16
+    assert set(body['result'][0]) == {'YEAR', 'MO', 'DY', 'HR', 'Wel'}
+    assert all(row['Wel'] >= 0 for row in body['result'])
+    assert fake.requests == 1
+
+
+@needs_model
+def test_calc_bad_request(service):
+    url, fake = service
+    code, body = post(url + '/calc', dict(PANEL, tracking='polar'))
+    assert code == 400
+    code, body = post(url + '/calc', {'length': 1})
+    assert code == 400
+    code, body = post(url + '/calc', dict(PANEL, tilt=30))
+    assert code == 400
+    for site in (['x'], {'lantitude': 'abc'}):
+        code, body = post(url + '/calc', dict(PANEL, site=site))
+        assert code == 400, site
+    assert fake.requests == 0
+
+
+@needs_model
+def test_distinct_urls_are_fetched_concurrently():
+    def fetch(url, backend):
+        time.sleep(0.3)
+        return synthetic_forecast(16, step=3)
+
+    batcher = MicroBatcher(window_ms=50, fetch=fetch)
+    panel = panel_from_request(PANEL)
+    started = time.perf_counter()
+    futures = [batcher.submit(panel, url=f'http://rp5.test/{i}') for i in range(4)]
+    results = [future.result(timeout=10) for future in futures]
+    assert time.perf_counter() - started < 0.3 * 4
+    assert all(len(df) == 16 for df in results)
+
+
+@needs_model
+def test_bad_item_does_not_fail_batch():
+    # Запросы в обход HTTP-проверки: плохая площадка завершает только свой future
+    batcher = MicroBatcher(window_ms=200, fetch=lambda url, backend: synthetic_forecast(16, step=3))
+    panel = panel_from_request(PANEL)
+    bad_list = batcher.submit(panel, site=['x'])
+    good = batcher.submit(panel, site={'lantitude': 55.0, 'longitude': 37.6, 'tz': 3})
+    bad_value = batcher.submit(panel, site={'lantitude': 'abc'})
+    plain = batcher.submit(panel)
+
+    assert len(good.result(timeout=10)) == 16
+    assert len(plain.result(timeout=10)) == 16
+    for future in (bad_list, bad_value):
+        with pytest.raises(ValueError):
+            future.result(timeout=10)
+    assert batcher.stats.snapshot()['batches'] == 1
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+import tables
+from tables import day_index, lookup_geometry
+
+
+def test_day_index_rejects_impossible_dates():
+    MO = [1, 2, 2, 4, 4, 12, 13, 0]
+    DY = [31, 29, 30, 30, 31, 31, 1, 1]
+    assert day_index(MO, DY).tolist() == [30, 59, -1, 120, -1, 365, -1, -1]
+
+
+def test_day_index_february_29_by_year():
+    assert day_index([2, 2, 2, 2], [29] * 4, [2023, 2024, 1900, 2000]).tolist() == [-1, 59, -1, 59]
+
+
+def test_lookup_geometry_invalid_date_is_nan():
+    geometry = lookup_geometry([4, 4, 2], [30, 31, 29], [12, 12, 12], [2024, 2024, 2023])
+    assert not np.isnan(geometry['sina'][0])
+    assert np.isnan(geometry['sina'][1:]).all()
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'tables.npz')
+    monkeypatch.setattr(tables, 'CACHE_PATH', path)
+    tables._tables.clear()
+    yield path
+    tables._tables.clear()
+
+
+def _expected():
+    return tables._build_tables()['sina']
+
+
+@pytest.mark.parametrize('content', [b'', b'not a zip', b'PK\x03\x04truncated'])
+def test_corrupt_cache_is_rebuilt(cache_path, content):
+    with open(cache_path, 'wb') as f:
+        f.write(content)
+    result = tables.load_tables()
+    assert np.array_equal(result['sina'], _expected(), equal_nan=True)
+
+    # Кэш перезаписан целым файлом и читается следующим запуском
+    tables._tables.clear()
+    with np.load(cache_path) as cache:
+        assert np.array_equal(cache['sina'], _expected(), equal_nan=True)
+    assert not [name for name in os.listdir(os.path.dirname(cache_path)) if '.tmp' in name]
+
+
+def test_truncated_cache_is_rebuilt(cache_path):
+    tables.load_tables()
+    with open(cache_path, 'rb') as f:
+        data = f.read()
+    with open(cache_path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    tables._tables.clear()
+    assert np.array_equal(tables.load_tables()['sina'], _expected(), equal_nan=True)
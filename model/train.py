@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.multioutput import MultiOutputRegressor
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEV_DIR = os.path.join(script_dir, '..', 'dev')
+sys.path.insert(0, DEV_DIR)
+
+from archive import prepare_archive, read_archive
+from features import FEATURES, build_features
+from normalizer import get_normalizer
+from schema import to_numeric
+from registry import MODEL_PATH, file_hash
+
+ARCHIVE_PATH = os.path.join(script_dir, 'data', '01.01.2009-30.07.2024.csv')
+SUN_PATH = os.path.join(script_dir, 'data', 'sun.csv')
+TARGETS_PATH = os.path.join(script_dir, 'data', 'rad_zvc.csv')
+ARTIFACTS_DIR = os.path.join(script_dir, 'artifacts')
+
+TARGETS = ['ALLSKY_SFC_SW_DIFF', 'ALLSKY_SFC_SW_DWN']
+
+# Параметры модели из train.ipynb; n_jobs=-1 - деревья обучаются на всех ядрах
+N_ESTIMATORS = 100
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+
+
+def load_dataset(archive_path=ARCHIVE_PATH, sun_path=SUN_PATH, targets_path=TARGETS_PATH):
+    df = prepare_archive(read_archive(archive_path), get_normalizer())
+
+    rad = pd.read_csv(sun_path, delimiter=';', encoding='utf-8', index_col=False)
+    df = pd.merge(df, rad[['MO', 'DY', 'HR', 'SZA']], on=['MO', 'DY', 'HR'], how='left')
+
+    solar = pd.read_csv(targets_path, delimiter=',', encoding='utf-8', index_col=False)
+    df = pd.merge(df, solar[['YEAR', 'MO', 'DY', 'HR'] + TARGETS], on=['YEAR', 'MO', 'DY', 'HR'], how='inner')
+
+    for column in ['SZA'] + TARGETS:
+        df[column] = to_numeric(df[column])
+    return df
+
+
+def evaluate(model, X, y):
+    y = np.asarray(y)
+    y_pred = model.predict(X)
+    return {
+        target: {
+            'mae': float(mean_absolute_error(y[:, i], y_pred[:, i])),
+            'mse': float(mean_squared_error(y[:, i], y_pred[:, i])),
+            'r2': float(r2_score(y[:, i], y_pred[:, i])),
+        }
+        for i, target in enumerate(TARGETS)
+    }
+
+
+def train(df, n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE, test_size=TEST_SIZE, n_jobs=-1):
+    X = build_features(df)
+    y = df[TARGETS]
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+    rf = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs)
+    model = MultiOutputRegressor(rf)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - start
+
+    metrics = {'test': evaluate(model, X_test, y_test), 'train': evaluate(model, X_train, y_train)}
+
+    # В приложении прогноз считается небольшими пачками: параллельный predict только добавил бы накладные расходы
+    for estimator in model.estimators_:
+        estimator.set_params(n_jobs=None)
+
+    params = {
+        'n_estimators': n_estimators,
+        'random_state': random_state,
+        'test_size': test_size,
+        'train_rows': len(X_train),
+        'test_rows': len(X_test),
+        'train_seconds': round(train_seconds, 3),
+    }
+    return model, metrics, params
+
+
+def save_artifact(model, metadata, artifacts_dir=ARTIFACTS_DIR):
+    os.makedirs(artifacts_dir, exist_ok=True)
+    version = metadata['version']
+    model_path = os.path.join(artifacts_dir, f'model-{version}.pkl')
+
+    # Без сжатия: модель быстрее загружается и может читаться через mmap (registry.MMAP_MODE)
+    joblib.dump(model, model_path)
+    metadata['model_sha256'] = file_hash(model_path)
+    with open(os.path.join(artifacts_dir, f'model-{version}.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    return model_path
+
+
+def install(model_path, target=MODEL_PATH):
+    # Замена через временный файл: registry никогда не увидит недописанную модель
+    tmp_path = target + '.tmp'
+    shutil.copyfile(model_path, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обучение модели радиации по архиву погоды rp5")
+    parser.add_argument('--archive', default=ARCHIVE_PATH, help="архив погоды rp5")
+    parser.add_argument('--sun', default=SUN_PATH, help="таблица SZA")
+    parser.add_argument('--targets', default=TARGETS_PATH, help="радиация NASA POWER")
+    parser.add_argument('--artifacts', default=ARTIFACTS_DIR, help="каталог версий модели")
+    parser.add_argument('--n-estimators', type=int, default=N_ESTIMATORS)
+    parser.add_argument('--jobs', type=int, default=-1, help="ядер для обучения (-1 - все)")
+    parser.add_argument('--no-install', action='store_true', help="не заменять dev/model.pkl")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df = load_dataset(args.archive, args.sun, args.targets)
+    print(f"Данные: {len(df)} строк, {time.perf_counter() - start:.1f} с")
+
+    model, metrics, params = train(df, n_estimators=args.n_estimators, n_jobs=args.jobs)
+
+    data_hash = {path: file_hash(path) for path in (args.archive, args.sun, args.targets)}
+    version = time.strftime('%Y%m%d-%H%M%S') + '-' + file_hash(args.archive)[:8]
+    metadata = {
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'features': FEATURES,
+        'targets': TARGETS,
+        'params': params,
+        'metrics': metrics,
+        'data': {
+            'files': {os.path.basename(path): digest for path, digest in data_hash.items()},
+            'rows': len(df),
+            'start': f"{df['YEAR'].iloc[0]:04d}-{df['MO'].iloc[0]:02d}-{df['DY'].iloc[0]:02d}",
+            'end': f"{df['YEAR'].iloc[-1]:04d}-{df['MO'].iloc[-1]:02d}-{df['DY'].iloc[-1]:02d}",
+        },
+        'sklearn': sklearn.__version__,
+    }
+    model_path = save_artifact(model, metadata, args.artifacts)
+
+    for split, values in metrics.items():
+        for target, scores in values.items():
+            print(f"{split} {target}: MAE {scores['mae']:.4f}, MSE {scores['mse']:.4f}, R^2 {scores['r2']:.4f}")
+    print(f"Модель: {model_path}")
+
+    if not args.no_install:
+        install(model_path)
+        print(f"Установлена в {MODEL_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())